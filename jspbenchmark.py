@@ -0,0 +1,341 @@
+#!/usr/bin/python3
+"""Benchmarks the model loading and the evaluation on the generated speedtest
+models and compares the results with a baseline.
+"""
+import sys
+import os
+import getopt
+import json
+import multiprocessing
+import platform
+import tempfile
+import time
+import numpy
+import jspgenerator
+from jspeval import JspEvaluator
+from jspmodel import JspModel
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+#: the measures, for which smaller values are better (the others are
+#: throughputs in solutions per second)
+LOWER_IS_BETTER = ("load_time", "load_time_gz", "peak_memory",
+                   "peak_memory_gz")
+
+
+def operation_count(params):
+    """Estimates the number of operations of a model from its parameters.
+
+    :params: the parameter dictionary, that is read from a yaml file.
+    :returns: the expected number of operations
+
+    """
+    return int(params["jobs"] * sum(params["operations"]) / 2)
+
+
+def get_configs(paths, max_operations=None):
+    """Collects the yaml files of the benchmark, sorted by their operation
+    count.
+
+    :paths: yaml files or directories containing yaml files
+    :max_operations: skip configs with more operations (None for no limit)
+    :returns: a list of (name, yaml file, operation count) tuples
+
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(jspgenerator.get_yaml_files(path))
+        else:
+            files.append(path)
+
+    configs = []
+    for filename in files:
+        _, params = jspgenerator.read_yaml(filename)
+        operations = operation_count(params)
+        if max_operations is None or operations <= max_operations:
+            name = os.path.splitext(os.path.basename(filename))[0]
+            configs.append((name, filename, operations))
+
+    return sorted(configs, key=lambda config: config[2])
+
+
+def generate_models(config, workdir, seed):
+    """Generates the plain and the compressed model of a config, unless they
+    were already generated with the same seed.
+
+    :config: the (name, yaml file, operation count) tuple
+    :workdir: the directory to keep the models in
+    :seed: the seed to use
+    :returns: the filenames of the plain and the compressed model
+
+    """
+    name, yaml_file, _ = config
+    output_dir = os.path.join(workdir, "seed{}".format(seed))
+    os.makedirs(output_dir, exist_ok=True)
+
+    filenames = []
+    for compression in (False, True):
+        filename = os.path.join(
+            output_dir, "{}.xml{}".format(name, ".gz" if compression else ""))
+        if not os.path.exists(filename):
+            jspgenerator.process_yaml(
+                [yaml_file], output_dir, numpy.uint32(seed), compression)
+        filenames.append(filename)
+
+    return filenames
+
+
+def _proc_status(field):
+    """Returns a memory field (e.g. VmHWM) of /proc/self/status in bytes (None,
+    if it can not be read).
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def max_rss():
+    """Returns the peak resident memory of this process in bytes (None, if it
+    can not be determined). On linux this is the peak since the last
+    reset_max_rss().
+    """
+    peak = _proc_status("VmHWM")
+    if peak is not None or resource is None:
+        return peak
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macOS bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def reset_max_rss():
+    """Resets the peak resident memory of this process to the current resident
+    memory (linux only).
+
+    :returns: the current resident memory in bytes (None, if the peak can not
+    be reset)
+
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        return None
+    return _proc_status("VmRSS")
+
+
+def _load_model(filename, queue):
+    """Loads a model in a child process and reports the time and the growth
+    of the peak memory.
+    """
+    before = reset_max_rss()
+    if before is None:
+        before = max_rss()
+    start = time.perf_counter()
+    JspModel(filename)
+    seconds = time.perf_counter() - start
+    after = max_rss()
+    queue.put((seconds, None if before is None else after - before))
+
+
+def measure_load(filename):
+    """Measures the load time and the peak memory of a model. Every model is
+    loaded in a freshly spawned process, so the peak memory is not influenced
+    by the models loaded before. The peak memory of the child is reset before
+    loading, because on linux the child keeps the peak of this process from
+    before the exec (where it can not be reset, e.g. on macOS, the growth is
+    only reliable while this process is smaller than the child).
+
+    :filename: the model file
+    :returns: the load time in seconds and the growth of the peak memory in
+    bytes
+
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_load_model, args=(filename, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+
+    return result
+
+
+def measure_evaluation(model, seed, solutions, repeats):
+    """Measures the throughput of evaluate() and evaluate_batch() for random
+    solutions.
+
+    :model: the model to evaluate the solutions for
+    :seed: the seed for the random solutions
+    :solutions: the number of solutions to evaluate
+    :repeats: the number of repetitions (the best is used)
+    :returns: the single solution and the batch throughput in solutions per
+    second
+
+    """
+    evaluator = JspEvaluator(model)
+    matrix = numpy.random.RandomState(seed).rand(
+        solutions, model.solution_length())
+
+    single = batch = 0.0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for values in matrix:
+            evaluator.evaluate(values)
+        single = max(single, solutions / (time.perf_counter() - start))
+
+        start = time.perf_counter()
+        evaluator.evaluate_batch(matrix)
+        batch = max(batch, solutions / (time.perf_counter() - start))
+
+    return single, batch
+
+
+def run_benchmark(configs, workdir, seed, solutions, repeats):
+    """Runs the benchmark for all configs.
+
+    :configs: the (name, yaml file, operation count) tuples
+    :workdir: the directory to keep the models in
+    :seed: the seed to use for the models and the solutions
+    :solutions: the number of solutions to evaluate per model
+    :repeats: the number of repetitions of every measurement
+    :returns: a dictionary with the environment and the measures of every
+    model
+
+    """
+    models = {}
+    for config in configs:
+        print("benchmarking: {}".format(config[0]))
+        plain, compressed = generate_models(config, workdir, seed)
+        measures = {"size": os.path.getsize(plain),
+                    "size_gz": os.path.getsize(compressed)}
+
+        loads = [measure_load(plain) for _ in range(repeats)]
+        measures["load_time"] = min(load[0] for load in loads)
+        measures["peak_memory"] = loads[0][1]
+        loads = [measure_load(compressed) for _ in range(repeats)]
+        measures["load_time_gz"] = min(load[0] for load in loads)
+        measures["peak_memory_gz"] = loads[0][1]
+
+        model = JspModel(plain)
+        measures["operations"] = model.solution_length()
+        measures["evaluate"], measures["evaluate_batch"] = \
+            measure_evaluation(model, seed, solutions, repeats)
+        models[config[0]] = measures
+
+    return {"seed": seed,
+            "solutions": solutions,
+            "python": platform.python_version(),
+            "numpy": numpy.__version__,
+            "models": models}
+
+
+def compare(results, baseline, tolerance):
+    """Compares benchmark results with a baseline.
+
+    :results: the results of run_benchmark()
+    :baseline: earlier results of run_benchmark()
+    :tolerance: the relative change, that is not yet a regression
+    :returns: a list of (model, measure, baseline value, value) tuples for
+    every regression
+
+    """
+    regressions = []
+    for name, measures in sorted(results["models"].items()):
+        base_measures = baseline["models"].get(name, {})
+        for measure, value in sorted(measures.items()):
+            base = base_measures.get(measure)
+            if measure in ("size", "size_gz", "operations") or \
+                    base is None or value is None:
+                continue
+            if measure in LOWER_IS_BETTER:
+                regressed = value > base * (1 + tolerance)
+            else:
+                regressed = value < base / (1 + tolerance)
+            if regressed:
+                regressions.append((name, measure, base, value))
+
+    return regressions
+
+
+def main():
+    """controls the benchmark.
+
+    :returns: None
+
+    """
+    usage_string = \
+        "usage: python3 jspbenchmark.py -[hswobtmnr] [<config.yaml|dir>, ...]"
+
+    try:
+        options, paths = getopt.getopt(
+            sys.argv[1:],
+            "hs:w:o:b:t:m:n:r:",
+            ["help", "seed=", "workdir=", "output=", "baseline=",
+             "tolerance=", "max-operations=", "solutions=", "repeats="])
+    except getopt.GetoptError:
+        print(usage_string)
+        sys.exit(1)
+
+    seed = 1
+    workdir = os.path.join(tempfile.gettempdir(), "jspbenchmark")
+    output = "benchmark.json"
+    baseline = None
+    tolerance = 0.1
+    max_operations = None
+    solutions = 100
+    repeats = 3
+
+    for opt, arg in options:
+        if opt in ("-h", "--help"):
+            print(usage_string)
+            sys.exit()
+        elif opt in ("-s", "--seed"):
+            seed = int(arg)
+        elif opt in ("-w", "--workdir"):
+            workdir = arg
+        elif opt in ("-o", "--output"):
+            output = arg
+        elif opt in ("-b", "--baseline"):
+            baseline = arg
+        elif opt in ("-t", "--tolerance"):
+            tolerance = float(arg)
+        elif opt in ("-m", "--max-operations"):
+            max_operations = int(arg)
+        elif opt in ("-n", "--solutions"):
+            solutions = int(arg)
+        elif opt in ("-r", "--repeats"):
+            repeats = int(arg)
+
+    configs = get_configs(
+        paths or [os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "yaml", "speedtest")],
+        max_operations)
+    results = run_benchmark(configs, workdir, seed, solutions, repeats)
+
+    with open(output, "w") as out_file:
+        json.dump(results, out_file, indent=2, sort_keys=True)
+    print("results saved to: {}".format(output))
+
+    if baseline is not None:
+        with open(baseline, "r") as base_file:
+            regressions = compare(results, json.load(base_file), tolerance)
+        for name, measure, base, value in regressions:
+            print("regression: {} {}: {:.6g} -> {:.6g}".format(
+                name, measure, base, value))
+        if regressions:
+            sys.exit(1)
+        print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,39 @@ Evaluator module.
 Holds the class JspEvaluator, which is used for evaluation of JspSolution and
 calculating machine assignments, schedules and metrics.
 """
+import heapq
+import math
+import multiprocessing
+import os
+import time
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
 import numpy
+from jspsolution import JspSolution, decode
+
+#: the names of all metrics in the order get_metrics() returns them
+METRICS = ("makespan", "tardiness", "flowfactor", "setuptime", "loadbalance",
+           "wip")
+
+#: the metrics, that can be bounded in evaluate(); partial schedules already
+#: give lower bounds for them
+BOUNDED_METRICS = ("makespan", "tardiness", "setuptime")
+
+#: the result of a bounded evaluation, that was aborted, because the metric
+#: exceeded its bound after step dispatch steps
+Aborted = namedtuple("Aborted", ("metric", "step"))
+
+#: the minimal number of solutions, for which evaluate_batch() schedules the
+#: population in lockstep (see JspEvaluator._schedule_population())
+LOCKSTEP_POPULATION = 64
+
+#: the wall time a chunk of solutions of ParallelJspEvaluator.evaluate_batch()
+#: shall take (the chunk size is derived from the measured time per solution)
+CHUNK_SECONDS = 0.05
+
+#: the minimal number of chunks per worker process, so the load is balanced
+#: even if the solutions take different times
+CHUNKS_PER_PROCESS = 4
 
 
 class JspEvaluator:
@@ -19,17 +51,117 @@ class JspEvaluator:
         - flowtime
     """
 
-    def __init__(self, model):
+    def __init__(self, model, cache_size=0, metrics=None, profile=False,
+                 bound_interval=None):
         """
         Takes the model, that shall be used to calculate the metrics.
+        Only the compiled arrays of the model are used, so its xml tree may
+        already be dropped.
+
+        @param model: the model, that shall be used to calculate the metrics
+        @type model: L{jspmodel.JspModel}
+        @param cache_size: the number of metric results evaluate() and
+        evaluate_batch() keep in a LRU cache (0 disables the cache)
+        @type cache_size: number
+        @param metrics: the metrics to calculate by default (names from
+        METRICS or their indexes), all if None
+        @type metrics: list
+        @param profile: if True, the time spent in every phase of the
+        evaluation and the dispatcher counters are recorded (see
+        profile_stats())
+        @type profile: bool
+        @param bound_interval: the number of dispatch steps between two
+        checks of the bounds in evaluate() (default: a sixteenth of the
+        solution length)
+        @type bound_interval: number
         """
         self.model = model
+        self._selection = METRICS
+        self._selection = self._select(metrics)
+        self._cache = _MetricsCache(cache_size) if cache_size > 0 else None
+        self._profile = _Profile() if profile else None
+        # plain lists of the compiled arrays (scalar access in the hot loops is
+        # a lot faster on lists than on numpy arrays)
+        self._durations = model.op_durations.tolist()
+        self._job_offsets = model.job_offsets.tolist()
+        self._releasetimes = model.job_releasetimes.tolist()
+        self._deadlines = model.job_deadlines.tolist()
+        self._weights = model.job_weights.tolist()
+        self._lotsizes = model.job_lotsizes.tolist()
+        self._op_jobs = model.op_jobs.tolist()
+        # the raw processing time of every job
+        self._job_ptimes = numpy.array([
+            sum(self._durations[start:end]) for start, end in
+            zip(self._job_offsets[:-1], self._job_offsets[1:])])
+        # the processing time of every operation and its successors in the job
+        self._remaining = list(self._durations)
+        for start, end in zip(self._job_offsets[:-1], self._job_offsets[1:]):
+            for op_index in range(end - 2, start - 1, -1):
+                self._remaining[op_index] += self._remaining[op_index + 1]
+        if bound_interval is None:
+            bound_interval = model.solution_length() // 16
+        #: the number of dispatch steps between two checks of the bounds
+        self.bound_interval = max(1, bound_interval)
 
-    def metrics_count(self):
+    def metrics_count(self, metrics=None):
         """Returns the number of metric values that will be returned by the
            calculation.
+
+        @param metrics: a metric selection (see evaluate()) or None for the
+        default selection
+        """
+        return len(self._select(metrics))
+
+    def _select(self, metrics):
         """
-        return 6
+        Normalizes a metric selection.
+
+        @param metrics: names from METRICS or their indexes, None for the
+        default selection of the evaluator
+        @type metrics: list
+
+        @return: the names of the selected metrics
+        @rtype: tuple
+        """
+        if metrics is None:
+            return self._selection
+
+        selection = []
+        for metric in metrics:
+            if isinstance(metric, str):
+                if metric not in METRICS:
+                    raise ValueError("unknown metric: {}".format(metric))
+                selection.append(metric)
+            elif isinstance(metric, (int, numpy.integer)) and \
+                    not isinstance(metric, (bool, numpy.bool_)) and \
+                    0 <= metric < len(METRICS):
+                selection.append(METRICS[metric])
+            else:
+                raise ValueError("unknown metric: {!r}".format(metric))
+        if not selection:
+            raise ValueError("no metric selected")
+
+        return tuple(selection)
+
+    def _bounds(self, bounds):
+        """
+        Normalizes the upper bounds of a bounded evaluation.
+
+        @param bounds: the upper bound for metrics from BOUNDED_METRICS (names
+        or their indexes in METRICS)
+        @type bounds: dict
+
+        @return: the (name, bound) pairs
+        @rtype: tuple
+        """
+        normalized = []
+        for metric, bound in bounds.items():
+            name = self._select([metric])[0]
+            if name not in BOUNDED_METRICS:
+                raise ValueError("metric can not be bounded: {}".format(name))
+            normalized.append((name, float(bound)))
+
+        return tuple(normalized)
 
     def build_machine_assignment(self, solution):
         """
@@ -49,6 +181,8 @@ class JspEvaluator:
                              self.model.solution_length(),
                              " operations versus ",
                              len(solution), " solution length)")
+        if self._profile is not None:
+            start = time.perf_counter()
 
         # create a dictionary of the operations and their priority per machine
         assignment = {}
@@ -58,6 +192,9 @@ class JspEvaluator:
             priority = solution.get_priority(index)
             assignment[global_idx] = (machine_idx, priority)
 
+        if self._profile is not None:
+            self._profile.add_time("build_machine_assignment",
+                                   time.perf_counter() - start)
         return assignment
 
     def execute_schedule(self, assignment):
@@ -77,38 +214,73 @@ class JspEvaluator:
         finish)
         @rtype: dict
         """
+        if self._profile is not None:
+            start = time.perf_counter()
+        operations = self.model.index_translation_list
+        machines = [assignment[op_id][0] for op_id in operations]
+        priorities = [assignment[op_id][1] for op_id in operations]
+
+        order, setups, finishes = self._dispatch(machines, priorities)
+
+        # the schedule lists the operations in the order of their dispatch
+        schedule = {operations[op]: (setups[op], finishes[op]) for op in order}
+        if self._profile is not None:
+            self._profile.add_time("execute_schedule",
+                                   time.perf_counter() - start)
+            self._count_dispatch(machines, order,
+                                 [len(order)] * self.model.machine_count)
+        return schedule
+
+    def _dispatch(self, machines, priorities):
+        """
+        Executes the list scheduling for one solution. All operations are
+        indexed globally (like in the solution).
+
+        @param machines: the assigned machine index for every operation
+        @type machines: list
+        @param priorities: the priority of every operation
+        @type priorities: list
 
-        schedule = {}
+        @return: 3 lists: the operations in the order they were dispatched, the
+        used setuptime and the finishtime for every operation
+        @rtype: list, list, list
+        """
+        job_offsets = self._job_offsets
+        setup_item = self.model.setuptimes.item
+        length = len(priorities)
+        setups = [0.0] * length
+        finishes = [0.0] * length
+        order = []
         # stores the finishing time of the last operation for every machine
-        machinetime = [0.0 for i in range(len(self.model.machine))]
-        # stores the last processed operation for every machine
-        last_op = [None for i in range(len(self.model.machine))]
-        # init the dict of available operations + their machines and priorities
-        avail_op = {}
-        for i in range(len(self.model.job)):
-            avail_op[(i, 0)] = assignment[(i, 0)]
+        machinetime = [0.0] * self.model.machine_count
+        # stores the last processed operation for every machine (the index
+        # of the setup matrix' "no previous operation" row at the beginning)
+        last_op = [length] * self.model.machine_count
+        # init the heap of available operations. It is ordered by the highest
+        # priority and, for equal priorities, by the time the operation became
+        # available (entries: (-priority, insertion number, operation))
+        avail_op = [(-priorities[job_offsets[i]], i, job_offsets[i])
+                    for i in range(self.model.job_count())]
+        heapq.heapify(avail_op)
+        insertions = len(avail_op)
 
         # calculate execution of all operations in order
-        for i in range(self.model.solution_length()):
+        for _ in range(length):
             # get the available operation with the highest priority
-            op_index = max(avail_op.keys(), key=lambda x: avail_op[x][1])
-            job = self.model.job[op_index[0]]
-            operation = job.operation[op_index[1]]
-            machine = avail_op[op_index][0]
+            op_index = heapq.heappop(avail_op)[2]
+            jobnum = self._op_jobs[op_index]
+            machine = machines[op_index]
 
             # the first operation's releasetime is the job's releasetime
-            if op_index[1] == 0:
-                releasetime = job.releasetime
+            if op_index == job_offsets[jobnum]:
+                releasetime = self._releasetimes[jobnum]
             else:
                 # all other operations can start when their predecessors
                 # are done
-                releasetime = \
-                    schedule[(op_index[0], op_index[1]-1)][1]
+                releasetime = finishes[op_index - 1]
 
             # calculate the setuptime
-            setuptime = self.model.get_setuptime(
-                last_op[machine],
-                op_index)
+            setuptime = setup_item(last_op[machine], op_index)
 
             # calculate the time the operation is finished
             if machinetime[machine] + setuptime > releasetime:
@@ -120,139 +292,1304 @@ class JspEvaluator:
                 start = releasetime
                 # readjust hidden setuptime (done in idle time)
                 setuptime = 0.0
-            finish_time = start + operation.op_duration
+            finish_time = start + self._durations[op_index]
 
-            schedule[op_index] = (setuptime, finish_time)
+            setups[op_index] = setuptime
+            finishes[op_index] = finish_time
+            order.append(op_index)
 
             # cleanup
             machinetime[machine] = finish_time
             last_op[machine] = op_index
-            del avail_op[(op_index[0], op_index[1])]
             # insert next operation into available list, if this was not the
             # last
-            if op_index[1] < len(self.model.job[op_index[0]].operation) - 1:
-                avail_op[(op_index[0], op_index[1]+1)] =\
-                    assignment[(op_index[0], op_index[1]+1)]
+            if op_index + 1 < job_offsets[jobnum + 1]:
+                heapq.heappush(
+                    avail_op,
+                    (-priorities[op_index + 1], insertions, op_index + 1))
+                insertions += 1
 
-        return schedule
+        return order, setups, finishes
+
+    def evaluate(self, solution, metrics=None, bounds=None):
+        """
+        Calculates the metrics (see get_metrics()) for a solution in a single
+        pass. The solution is decoded, scheduled and the metrics are
+        accumulated without building the assignment and schedule dicts.
+        build_machine_assignment(), execute_schedule() and get_metrics() give
+        the same results and show the intermediate steps.
+
+        If upper bounds are given, the partial schedule is checked every
+        bound_interval dispatch steps and the scheduling is aborted at the
+        first check, that shows that a bounded metric will exceed its bound
+        (so the step of Aborted is a multiple of bound_interval or the
+        solution length). Bounded evaluations bypass the cache.
+
+        @param solution: a solution for this model (or its value array)
+        @type solution: L{jspsolution.JspSolution}
+        @param metrics: the metrics to calculate (names from METRICS or their
+        indexes), the selection of the evaluator if None
+        @type metrics: list
+        @param bounds: the upper bound for metrics from BOUNDED_METRICS (names
+        or their indexes in METRICS)
+        @type bounds: dict
+
+        @return: the values of the selected metrics in the order of the
+        selection or Aborted, if a bound was exceeded
+        @rtype: list
+        """
+        selection = self._select(metrics)
+        machines, priorities = self._decode_solution(solution)
+
+        if bounds is not None:
+            return self._evaluate_bounded(
+                machines, priorities.tolist(), selection, self._bounds(bounds))
+
+        if self._cache is None:
+            return self._evaluate_decoded(
+                machines, priorities.tolist(), selection)
+
+        key = (selection, _cache_keys(machines, priorities))
+        result = self._cache.get(key)
+        if result is None:
+            result = self._evaluate_decoded(
+                machines, priorities.tolist(), selection)
+            self._cache.put(key, result)
+        return list(result)
+
+    def evaluate_batch(self, matrix, metrics=None):
+        """
+        Evaluates a whole population at once. Every row of the matrix is the
+        value array of one solution. No JspSolution, assignment or schedule
+        objects are created.
+
+        @param matrix: the solutions, one per row (N x solution_length)
+        @type matrix: numpy.ndarray
+        @param metrics: the metrics to calculate (see evaluate())
+        @type metrics: list
+
+        @return: the metrics for every solution, one row per solution in the
+        order of the selection (N x metrics_count(metrics))
+        @rtype: numpy.ndarray
+        """
+        selection = self._select(metrics)
+        matrix = numpy.asarray(matrix, dtype=numpy.float64)
+        if matrix.ndim != 2 or \
+                matrix.shape[1] != self.model.solution_length():
+            raise ValueError("the solutions do not fit the model (",
+                             self.model.solution_length(),
+                             " operations versus shape ",
+                             matrix.shape, ")")
+
+        machines, priorities = self._timed(
+            "decode", decode, self.model, matrix)
+
+        results = numpy.empty((len(matrix), len(selection)))
+        if self._cache is None:
+            rows = range(len(matrix))
+            duplicates = []
+        else:
+            rows, keys, duplicates = self._cache_lookup(
+                selection, machines, priorities, results)
+
+        if not len(rows):
+            # all solutions were cached (or there are none)
+            return results
+
+        # schedule the solutions and calculate their metrics all at once
+        if len(rows) >= LOCKSTEP_POPULATION:
+            job_starts, job_ends, setuptimes = self._schedule_population(
+                machines[rows], priorities[rows])
+        else:
+            job_starts = numpy.empty((len(rows), self.model.job_count()))
+            job_ends = numpy.empty((len(rows), self.model.job_count()))
+            setuptimes = numpy.empty(len(rows))
+            for index, row in enumerate(rows):
+                state = self._schedule_decoded(
+                    machines[row], priorities[row].tolist())
+                job_starts[index] = state.job_starts
+                job_ends[index] = state.job_ready
+                setuptimes[index] = state.setuptime
+        results[rows] = self._calc_metrics(
+            machines[rows], job_starts, job_ends, setuptimes, selection)
+
+        if self._cache is not None:
+            for row, key in zip(rows, keys):
+                self._cache.put(key, results[row])
+            for row, source in duplicates:
+                results[row] = results[source]
+
+        return results
+
+    def _cache_lookup(self, selection, machines, priorities, results):
+        """
+        Fills the rows of results, that are found in the cache.
+
+        @return: the rows to evaluate, their cache keys and the rows that are
+        duplicates of an other row to evaluate (as (row, source row) pairs)
+        @rtype: list, list, list
+        """
+        rows = []
+        keys = []
+        duplicates = []
+        pending = {}
+        for row, key in enumerate(_cache_keys(machines, priorities)):
+            key = (selection, key)
+            if key in pending:
+                # evaluated sequentially this would be a hit
+                self._cache.hits += 1
+                duplicates.append((row, pending[key]))
+                continue
+            result = self._cache.get(key)
+            if result is None:
+                pending[key] = row
+                rows.append(row)
+                keys.append(key)
+            else:
+                results[row] = result
+
+        return rows, keys, duplicates
+
+    def cache_info(self):
+        """
+        Returns the statistics of the metrics cache.
+
+        @return: a dictionary with the entries hits, misses, size and maxsize
+        (None if the cache is disabled)
+        @rtype: dict
+        """
+        if self._cache is None:
+            return None
+        return self._cache.info()
+
+    def cache_clear(self):
+        """
+        Empties the metrics cache and resets its statistics.
+        """
+        if self._cache is not None:
+            self._cache.clear()
+
+    def _decode_solution(self, solution):
+        """
+        Checks the length of a single solution and decodes it (see
+        jspsolution.decode()).
+
+        @param solution: a solution for this model (or its value array)
+        @type solution: L{jspsolution.JspSolution}
+
+        @return: the machine indexes and the priorities
+        @rtype: numpy.ndarray, numpy.ndarray
+        """
+        if isinstance(solution, JspSolution):
+            solution = solution.get_values()
+        if self.model.solution_length() != len(solution):
+            raise ValueError("the solution does not fit the model (",
+                             self.model.solution_length(),
+                             " operations versus ",
+                             len(solution), " solution length)")
+
+        return self._timed("decode", decode, self.model, solution)
+
+    def _evaluate_decoded(self, machines, priorities, selection=None):
+        """
+        The fused list scheduling and metric calculation for one decoded
+        solution.
 
-    def get_metrics(self, assignment, schedule):
+        @param machines: the assigned machine index for every operation
+        @type machines: numpy.ndarray
+        @param priorities: the priority of every operation
+        @type priorities: list
+        @param selection: the names of the metrics to calculate
+        @type selection: tuple
+
+        @return: the values of the selected metrics
+        @rtype: list
+        """
+        state = self._schedule_decoded(machines, priorities)
+
+        return self._state_metrics(machines, state, selection)
+
+    def _evaluate_bounded(self, machines, priorities, selection, bounds):
+        """
+        The fused list scheduling for one decoded solution, that checks the
+        bounds every few dispatch steps.
+
+        @param machines: the assigned machine index for every operation
+        @type machines: numpy.ndarray
+        @param priorities: the priority of every operation
+        @type priorities: list
+        @param selection: the names of the metrics to calculate
+        @type selection: tuple
+        @param bounds: the (name, bound) pairs to check
+        @type bounds: tuple
+
+        @return: the values of the selected metrics or Aborted
+        @rtype: list
+        """
+        state = self._new_state(priorities)
+        exceeded = self._run(machines.tolist(), priorities, state,
+                             interval=self.bound_interval, bounds=bounds)
+        if exceeded is not None:
+            return Aborted(exceeded, state.step)
+
+        return self._state_metrics(machines, state, selection)
+
+    def _schedule_decoded(self, machines, priorities):
+        """
+        Runs the fused list scheduling for one decoded solution.
+
+        @param machines: the assigned machine index for every operation
+        @type machines: numpy.ndarray
+        @param priorities: the priority of every operation
+        @type priorities: list
+
+        @return: the state after all operations are dispatched
+        @rtype: L{_DispatchState}
+        """
+        state = self._new_state(priorities)
+        self._run(machines.tolist(), priorities, state)
+        return state
+
+    def _schedule_population(self, machines, priorities):
+        """
+        Runs the list scheduling for a whole population in lockstep. Every
+        solution takes solution_length() dispatch steps, so every step
+        dispatches one operation of every solution with a few array
+        operations over the population: the available operation with the
+        highest priority (the earliest inserted one for equal priorities,
+        like the heap of _run()) is selected for every solution, its start
+        and finish are calculated from the gathered ready-, machine- and
+        setuptimes and scattered back. The results are identical to _run().
+
+        @param machines: the assigned machine index for every operation (N x
+        solution_length)
+        @type machines: numpy.ndarray
+        @param priorities: the priority of every operation (N x
+        solution_length)
+        @type priorities: numpy.ndarray
+
+        @return: the start and the readytime of every job (N x jobs) and the
+        total setuptime of every solution (N)
+        @rtype: numpy.ndarray, numpy.ndarray, numpy.ndarray
+        """
+        if self._profile is not None:
+            started = time.perf_counter()
+        count, length = priorities.shape
+        job_count = self.model.job_count()
+        machine_count = self.model.machine_count
+        first_ops = self.model.job_offsets[:-1]
+        end_ops = self.model.job_offsets[1:]
+        durations = self.model.op_durations
+        setuptimes = self.model.setuptimes
+        if isinstance(setuptimes, numpy.ndarray):
+            def lookup(rows, cols):
+                return setuptimes[rows, cols]
+        else:
+            lookup = setuptimes.lookup
+
+        rows = numpy.arange(count)
+        # the available operation of every job, its priority (-inf, when the
+        # job is done) and its insertion number
+        next_op = numpy.tile(first_ops, (count, 1))
+        available = priorities[:, first_ops]
+        inserted = numpy.tile(numpy.arange(job_count), (count, 1))
+        insertions = numpy.full(count, job_count)
+        machinetime = numpy.zeros((count, machine_count))
+        last_op = numpy.full((count, machine_count), length)
+        job_starts = numpy.zeros((count, job_count))
+        job_ready = numpy.tile(self.model.job_releasetimes, (count, 1))
+        total_setuptime = numpy.zeros(count)
+        if self._profile is not None:
+            order = numpy.empty((count, length), dtype=numpy.intp)
+        no_job = numpy.iinfo(numpy.intp).max
+
+        for step in range(length):
+            highest = available.max(axis=1)
+            job = numpy.where(available == highest[:, numpy.newaxis],
+                              inserted, no_job).argmin(axis=1)
+            op_index = next_op[rows, job]
+            machine = machines[rows, op_index]
+            releasetime = job_ready[rows, job]
+            time_free = machinetime[rows, machine]
+
+            setuptime = lookup(last_op[rows, machine], op_index)
+            ready = time_free + setuptime
+            delayed = ready > releasetime
+            start = numpy.where(delayed, ready, releasetime)
+            # partial setuptimes, hidden setuptimes are done in idle time
+            setuptime = numpy.where(
+                delayed,
+                numpy.where(releasetime > time_free,
+                            setuptime - (releasetime - time_free),
+                            setuptime),
+                0.0)
+            finish_time = start + durations[op_index]
+
+            total_setuptime += setuptime
+            job_ready[rows, job] = finish_time
+            first = op_index == first_ops[job]
+            job_starts[rows[first], job[first]] = \
+                finish_time[first] - durations[op_index[first]]
+            machinetime[rows, machine] = finish_time
+            last_op[rows, machine] = op_index
+            if self._profile is not None:
+                order[:, step] = op_index
+
+            # make the next operation of the job available
+            successor = op_index + 1
+            more = successor < end_ops[job]
+            next_op[rows, job] = successor
+            available[rows, job] = numpy.where(
+                more, priorities[rows, numpy.minimum(successor, length - 1)],
+                -numpy.inf)
+            inserted[rows, job] = insertions
+            insertions += more
+
+        if self._profile is not None:
+            self._profile.add_time("schedule",
+                                   time.perf_counter() - started)
+            for row in range(count):
+                self._count_dispatch(machines[row].tolist(),
+                                     order[row].tolist(),
+                                     [length] * machine_count)
+        return job_starts, job_ready, total_setuptime
+
+    def _state_metrics(self, machines, state, selection=None):
+        """
+        Calculates the selected metrics for one completely scheduled
+        solution.
+
+        @param machines: the assigned machine index for every operation
+        @type machines: numpy.ndarray
+        @param state: the state after all operations are dispatched
+        @type state: L{_DispatchState}
+        @param selection: the names of the metrics to calculate
+        @type selection: tuple
+
+        @return: the values of the selected metrics
+        @rtype: list
+        """
+        return self._calc_metrics(
+            machines[numpy.newaxis], [state.job_starts], [state.job_ready],
+            [state.setuptime], selection)[0].tolist()
+
+    def _new_state(self, priorities):
+        """
+        Creates the dispatcher state before the first dispatch step.
+
+        @param priorities: the priority of every operation
+        @type priorities: list
+
+        @return: the initial state
+        @rtype: L{_DispatchState}
+        """
+        job_offsets = self._job_offsets
+        state = _DispatchState()
+        state.step = 0
+        # stores the finishing time of the last operation for every machine
+        state.machinetime = [0.0] * self.model.machine_count
+        # stores the last processed operation for every machine (the index
+        # of the setup matrix' "no previous operation" row at the beginning)
+        state.last_op = [len(priorities)] * self.model.machine_count
+        # the heap of available operations (see _dispatch())
+        state.avail_op = [(-priorities[job_offsets[i]], i, job_offsets[i])
+                          for i in range(self.model.job_count())]
+        heapq.heapify(state.avail_op)
+        state.insertions = len(state.avail_op)
+        # the start of every job and the readytime of its last dispatched
+        # operation (the releasetime before any operation is dispatched)
+        state.job_starts = [0.0] * self.model.job_count()
+        state.job_ready = list(self._releasetimes)
+        state.setuptime = 0.0
+        state.order = []
+
+        return state
+
+    def _run(self, machines, priorities, state, checkpoints=None,
+             interval=None, bounds=None):
+        """
+        Continues the fused list scheduling from state until all operations
+        are dispatched. Only the start- and readytimes of the jobs are kept,
+        the setuptimes are summed up on the fly.
+
+        If bounds are given, they are checked every interval dispatch steps
+        and the scheduling stops at the first exceeded bound.
+
+        @param machines: the assigned machine index for every operation
+        @type machines: list
+        @param priorities: the priority of every operation
+        @type priorities: list
+        @param state: the dispatcher state, that is updated in place
+        @type state: L{_DispatchState}
+        @param checkpoints: if given, a snapshot of the state is appended
+        every interval dispatch steps (at multiples of interval)
+        @type checkpoints: list
+        @param interval: the number of dispatch steps between checkpoints
+        (and checks of the bounds)
+        @type interval: number
+        @param bounds: the (name, bound) pairs to check
+        @type bounds: tuple
+
+        @return: the name of the exceeded metric or None
+        @rtype: str
+        """
+        if self._profile is not None:
+            started = (time.perf_counter(), state.step, list(state.last_op))
+        job_offsets = self._job_offsets
+        op_jobs = self._op_jobs
+        durations = self._durations
+        setup_item = self.model.setuptimes.item
+        length = len(priorities)
+        if interval is None:
+            interval = length
+        machinetime = state.machinetime
+        last_op = state.last_op
+        avail_op = state.avail_op
+        job_starts = state.job_starts
+        job_ready = state.job_ready
+        order = state.order
+        insertions = state.insertions
+        total_setuptime = state.setuptime
+
+        exceeded = None
+        pending = None
+        if bounds is not None and "makespan" in dict(bounds):
+            # the processing time still to dispatch on every machine
+            pending = numpy.bincount(
+                machines, weights=self.model.op_durations,
+                minlength=self.model.machine_count).tolist()
+            dispatched = 0
+
+        step = state.step
+        while step < length:
+            if checkpoints is not None:
+                checkpoints.append(
+                    state.snapshot(step, insertions, total_setuptime))
+            segment_end = min(step + interval, length)
+
+            for _ in range(step, segment_end):
+                op_index = heapq.heappop(avail_op)[2]
+                jobnum = op_jobs[op_index]
+                machine = machines[op_index]
+                releasetime = job_ready[jobnum]
+
+                setuptime = setup_item(last_op[machine], op_index)
+
+                if machinetime[machine] + setuptime > releasetime:
+                    start = machinetime[machine] + setuptime
+                    if releasetime > machinetime[machine]:
+                        setuptime -= releasetime - machinetime[machine]
+                else:
+                    start = releasetime
+                    setuptime = 0.0
+                finish_time = start + durations[op_index]
+
+                total_setuptime += setuptime
+                job_ready[jobnum] = finish_time
+                if op_index == job_offsets[jobnum]:
+                    # computed like in get_metrics() to get identical values
+                    job_starts[jobnum] = finish_time - durations[op_index]
+                machinetime[machine] = finish_time
+                last_op[machine] = op_index
+                order.append(op_index)
+
+                if op_index + 1 < job_offsets[jobnum + 1]:
+                    heapq.heappush(
+                        avail_op,
+                        (-priorities[op_index + 1], insertions, op_index + 1))
+                    insertions += 1
+
+            step = segment_end
+            if bounds is not None:
+                if pending is not None:
+                    for op_index in order[dispatched:]:
+                        pending[machines[op_index]] -= durations[op_index]
+                    dispatched = len(order)
+                exceeded = self._exceeded(
+                    state, total_setuptime, pending, bounds)
+                if exceeded is not None:
+                    break
+
+        state.step = step
+        state.insertions = insertions
+        state.setuptime = total_setuptime
+        if self._profile is not None:
+            self._profile.add_time("schedule",
+                                   time.perf_counter() - started[0])
+            self._count_dispatch(machines, order[started[1]:], started[2])
+        return exceeded
+
+    def _exceeded(self, state, setuptime, pending, bounds):
+        """
+        Checks the lower bounds of a partial schedule against the upper
+        bounds. Every job is ready at the earliest after its remaining
+        operations are processed without any waiting times, every machine
+        at the earliest after its pending operations are processed; the
+        setuptimes are never reduced. For a complete schedule the lower
+        bounds are the exact metrics, for partial schedules they are only
+        compared with a small tolerance (the remaining processing times are
+        summed up in a different order, than the actual finishtimes).
+
+        @param state: the dispatcher state
+        @type state: L{_DispatchState}
+        @param setuptime: the sum of the setuptimes so far
+        @type setuptime: number
+        @param pending: the processing time still to dispatch on every machine
+        (only needed for the makespan)
+        @type pending: list
+        @param bounds: the (name, bound) pairs to check
+        @type bounds: tuple
+
+        @return: the name of the first exceeded metric or None
+        @rtype: str
         """
-        Calculates the following metrics:
+        tolerance = 1e-9 if state.avail_op else 0.0
+
+        for metric, bound in bounds:
+            if metric == "setuptime":
+                value = setuptime
+            elif metric == "tardiness":
+                job_ends = list(state.job_ready)
+                for entry in state.avail_op:
+                    op_index = entry[2]
+                    job_ends[self._op_jobs[op_index]] += \
+                        self._remaining[op_index]
+                value = self._calc_tardiness(numpy.array(job_ends))
+            elif state.avail_op:
+                # the finished jobs are ready before their last machine
+                job_ready = state.job_ready
+                value = max(
+                    max(job_ready[self._op_jobs[entry[2]]] +
+                        self._remaining[entry[2]]
+                        for entry in state.avail_op),
+                    max(time + load for time, load in
+                        zip(state.machinetime, pending)))
+            else:
+                value = max(state.job_ready)
+            if value > bound + tolerance * max(1.0, abs(bound)):
+                return metric
+
+        return None
+
+    def profile_stats(self):
+        """
+        Returns a snapshot of the recorded profile:
+            - time: the cumulative wall time of every phase in seconds
+            - calls: the number of calls of every phase
+            - dispatch_steps: the number of dispatched operations
+            - setup_lookups: the number of looked up setuptimes, that were
+              nonzero and zero
+
+        The phases are decode, build_machine_assignment, execute_schedule,
+        schedule (the fused list scheduling of evaluate()) and the metrics
+        (every call calculates a metric for a whole population).
+
+        @return: the profile or None, if profiling is disabled
+        @rtype: dict
+        """
+        if self._profile is None:
+            return None
+        return self._profile.snapshot()
+
+    @contextmanager
+    def profiling(self):
+        """
+        Records a profile for the evaluations in a with block. The yielded
+        dict is filled with the snapshot (see profile_stats()) when the block
+        is left. The counts are also added to the profile of the evaluator,
+        if it is enabled.
+
+        Example::
+
+            with evaluator.profiling() as stats:
+                evaluator.evaluate_batch(population)
+            print(stats["time"]["schedule"])
+        """
+        outer = self._profile
+        self._profile = _Profile()
+        stats = {}
+        try:
+            yield stats
+        finally:
+            profile = self._profile
+            self._profile = outer
+            if outer is not None:
+                outer.merge(profile)
+            stats.update(profile.snapshot())
+
+    def _timed(self, phase, function, *args):
+        """
+        Calls the function and records its wall time for the phase, if
+        profiling is enabled.
+        """
+        if self._profile is None:
+            return function(*args)
+        start = time.perf_counter()
+        result = function(*args)
+        self._profile.add_time(phase, time.perf_counter() - start)
+        return result
+
+    def _count_dispatch(self, machines, order, last_op):
+        """
+        Counts the dispatch steps and replays the setuptime lookups of a
+        list scheduling run, so the hot loops stay free of counters.
+
+        @param machines: the assigned machine index for every operation
+        @type machines: list
+        @param order: the operations in the order they were dispatched
+        @type order: list
+        @param last_op: the last processed operation for every machine
+        before the first dispatched operation
+        @type last_op: list
+        """
+        setup_item = self.model.setuptimes.item
+        zero = 0
+        for op_index in order:
+            machine = machines[op_index]
+            if setup_item(last_op[machine], op_index) == 0:
+                zero += 1
+            last_op[machine] = op_index
+
+        self._profile.dispatch_steps += len(order)
+        self._profile.setup_lookups += len(order) - zero
+        self._profile.zero_setup_lookups += zero
+
+    def get_metrics(self, assignment, schedule, metrics=None):
+        """
+        Calculates the following metrics (see METRICS):
             - makespan
             - total weighted tardiness
             - flowfactor
-            - load balance
             - setup time
+            - load balance
             - max wip
 
         @param assignment:     the machine assignment for the operations
         @type assignment: dict
         @param schedule:       The calculated schedule for a solution.
         @type schedule: dict
+        @param metrics: the metrics to calculate (see evaluate())
+        @type metrics: list
 
-        @return:        a tuple with the metric values in the above order.
-        @rtype: dict
+        @return:        a list with the metric values in the above order (or
+        the order of the selection).
+        @rtype: list
         """
-        # search for the last readytime
-        makespan = max(schedule.values(), key=lambda x: x[1])[1]
-
-        # calculate tardiness
-        twt = self._calc_tardiness(schedule)
-
-        # calculate the loadbalance
-        loadbalance = self._calc_loadbalance(assignment, makespan)
+        operations = self.model.index_translation_list
+        machines = numpy.array([assignment[op_id][0] for op_id in operations])
+        finishes = numpy.array([schedule[op_id][1] for op_id in operations])
+        starts = finishes[self.model.job_offsets[:-1]] - \
+            self.model.op_durations[self.model.job_offsets[:-1]]
 
         # sum all setuptimes
         setuptime = sum(times[0] for times in schedule.values())
 
-        # calculate the WIP and flowfactor
-        wip, flowfactor = self._calc_wip_and_flow(schedule)
+        return self._calc_metrics(
+            machines[numpy.newaxis], starts[numpy.newaxis],
+            self._job_ready_times(finishes[numpy.newaxis]), [setuptime],
+            self._select(metrics))[0].tolist()
 
-        return [makespan, twt, flowfactor, setuptime, loadbalance, wip]
+    def _calc_metrics(self, machines, job_starts, job_ends, setuptimes,
+                      selection=None):
+        """ Calculates the selected metrics for a population (one solution
+        per row) from the globally indexed machine assignments and the start-
+        and readytimes of the jobs (see get_metrics()). Only the intermediate
+        values the selected metrics need are calculated.
 
-    def _calc_tardiness(self, schedule):
-        """ Calculates the maximum timespan a job in schedule is too late.
+        All metrics depend on the schedule, the load balance is normalized by
+        the makespan.
 
-        @param schedule: the schedule to calculate the tardiness for
-        @type schedule: dict
+        @param machines: the assigned machine index for every operation
+        (N x solution_length)
+        @type machines: numpy.ndarray
+        @param job_starts: the time every job starts processing (N x jobs)
+        @type job_starts: numpy.ndarray
+        @param job_ends: the time every job is ready (N x jobs)
+        @type job_ends: numpy.ndarray
+        @param setuptimes: the sum of all setuptimes of every solution
+        @type setuptimes: numpy.ndarray
+        @param selection: the names of the metrics to calculate, the default
+        selection if None
+        @type selection: tuple
 
-        @return:  the tardiness value
-        @rtype: number
+        @return:  the values of the selected metrics (N x len(selection))
+        @rtype: numpy.ndarray
+        """
+        if selection is None:
+            selection = self._selection
+        job_starts = numpy.asarray(job_starts, dtype=numpy.float64)
+        job_ends = numpy.asarray(job_ends, dtype=numpy.float64)
+        values = {"setuptime": setuptimes}
+
+        if "makespan" in selection or "loadbalance" in selection:
+            # search for the last readytime
+            values["makespan"] = self._timed(
+                "makespan", numpy.max, job_ends, -1)
+
+        if "tardiness" in selection:
+            values["tardiness"] = self._timed(
+                "tardiness", self._calc_tardiness, job_ends)
+
+        if "loadbalance" in selection:
+            values["loadbalance"] = self._timed(
+                "loadbalance", self._calc_loadbalance,
+                machines, values["makespan"])
+
+        if "flowfactor" in selection:
+            values["flowfactor"] = self._timed(
+                "flowfactor", self._calc_flowfactor, job_starts, job_ends)
+
+        if "wip" in selection:
+            values["wip"] = self._timed(
+                "wip", self._calc_wip, job_starts, job_ends)
+
+        return numpy.stack([values[metric] for metric in selection], axis=-1)
+
+    def _job_ready_times(self, finishes):
+        """ Calculates the readytime of every job as the maximum finishtime of
+        its operations.
+
+        @param finishes: the finishtime of every operation (N x
+        solution_length)
+        @type finishes: numpy.ndarray
+
+        @return: the readytimes (N x jobs)
+        @rtype: numpy.ndarray
         """
-        # find the maximum readytime for each job and compare to the
-        # deadline
-        job_ready = {}
-        for op_id in schedule:
-            if job_ready.get(op_id[0], 0.0) < schedule[op_id][1]:
-                job_ready[op_id[0]] = schedule[op_id][1]
+        return numpy.maximum.reduceat(
+            finishes, self.model.job_offsets[:-1], axis=-1)
 
-        twt = 0.0
-        for jobnum in job_ready:
-            t_ready = job_ready[jobnum]
-            deadline = self.model.job[jobnum].deadline
-            weight = self.model.job[jobnum].weight
-            if t_ready > deadline:
-                twt += (t_ready - deadline) * weight
+    def _calc_tardiness(self, job_ends):
+        """ Calculates the total weighted tardiness (the time the jobs are too
+        late).
 
-        return twt
+        @param job_ends: the readytime of every job (N x jobs)
+        @type job_ends: numpy.ndarray
 
-    def _calc_loadbalance(self, assignment, makespan):
+        @return:  the tardiness values
+        @rtype: numpy.ndarray
+        """
+        lateness = job_ends - self.model.job_deadlines
+        return (numpy.maximum(lateness, 0.0) * self.model.job_weights).sum(
+            axis=-1)
+
+    def _calc_loadbalance(self, machines, makespan):
         """ Calculated the load balance for the machines in assignment.
 
-        @param assignment: the machine assignment to calculate the load balance
-        for.
-        @type assignment: dict
+        @param machines: the machine assignment to calculate the load balance
+        for. (the machine index for every operation, N x solution_length)
+        @type machines: numpy.ndarray
         @param makespan: the makespan for the schedule. (For load
         normalization)
-        @type makespan: number
+        @type makespan: numpy.ndarray
 
-        @return: the loadbalance value
-        @rtype: number
+        @return: the loadbalance values
+        @rtype: numpy.ndarray
         """
-        # sum all production times for every machine
-        m_prod_times = [0.0 for _ in enumerate(self.model.machine)]
-        for op_id, assign in assignment.items():
-            m_prod_times[assign[0]] +=\
-                self.model.job[op_id[0]].operation[op_id[1]].op_duration
-        for idx, time in enumerate(m_prod_times):
-            m_prod_times[idx] = time/makespan
+        count = self.model.machine_count
+        rows = len(machines)
+        # sum all production times for every machine (of every solution)
+        offsets = count * numpy.arange(rows)[:, numpy.newaxis]
+        m_prod_times = numpy.bincount(
+            (machines + offsets).ravel(),
+            weights=numpy.tile(self.model.op_durations, rows),
+            minlength=rows * count).reshape(rows, count)
+        # (bincount gives integers for an empty population)
+        m_prod_times = m_prod_times / makespan[:, numpy.newaxis]
         # calculate the standard deviation
-        return numpy.std(m_prod_times)
+        return numpy.std(m_prod_times, axis=-1)
 
-    def _calc_wip_and_flow(self, schedule):
-        """ Calculates the maximum WIP (work in process) and the average flow factor.
+    def _calc_flowfactor(self, job_starts, job_ends):
+        """ Calculates the average flow factor.
 
-        @param schedule: the schedule to calculate the WIP and flowfactor for.
-        @type schedule: dict
+        @param job_starts: the time every job starts processing (N x jobs)
+        @type job_starts: numpy.ndarray
+        @param job_ends: the time every job is ready (N x jobs)
+        @type job_ends: numpy.ndarray
 
-        @return: 2 values: max wip, avg flowfactor
-        @rtype: number, number
-        """
-        # create a list of all job start- and endtimes and their effects on the
-        # WIP
-        # use the start- and endtimes to calculate the flow factor for the job
-        wip_changes = {}
-        flowfactors = []
-        for job_id, job in enumerate(self.model.job):
-            last_op = len(job.operation) - 1
-            jobstart = schedule[(job_id, 0)][1] - job.operation[0].op_duration
-            jobend = schedule[(job_id, last_op)][1]
-            lotsize = job.lotsize
-            wip_changes[jobstart] = lotsize
-            wip_changes[jobend] = -lotsize
-
-            # calculate the raw processtime for the job
-            ptime = sum([op.op_duration for op in job.operation])
-            # store the passtimes
-            flowfactors.append((jobend - jobstart) / ptime)
+        @return: the average flowfactors
+        @rtype: numpy.ndarray
+        """
+        # use the start- and endtimes and the raw processtime of each job to
+        # calculate its flow factor
+        return numpy.mean((job_ends - job_starts) / self._job_ptimes, axis=-1)
+
+    def _calc_wip(self, job_starts, job_ends):
+        """ Calculates the maximum WIP (work in process). A job, that ends at
+        the same time another job starts, does not count towards the WIP at
+        that time.
+
+        @param job_starts: the time every job starts processing (N x jobs)
+        @type job_starts: numpy.ndarray
+        @param job_ends: the time every job is ready (N x jobs)
+        @type job_ends: numpy.ndarray
+
+        @return: the max wips
+        @rtype: numpy.ndarray
+        """
+        # all job end- and starttimes and their effects on the WIP, the
+        # stable sort keeps the ends before the starts on equal times
+        times = numpy.concatenate((job_ends, job_starts), axis=-1)
+        lotsizes = self.model.job_lotsizes
+        changes = numpy.concatenate((-lotsizes, lotsizes))
+        order = numpy.argsort(times, axis=-1, kind="stable")
 
         # go through the wip changes in order and record the max occuring WIP
-        max_wip = 0
-        curr_wip = 0
-        for _, change in sorted(wip_changes.items()):
-            curr_wip += change
-            if curr_wip > max_wip:
-                max_wip = curr_wip
-
-        return max_wip, numpy.average(flowfactors)
+        wip = numpy.cumsum(changes[order], axis=-1)
+        return numpy.maximum(wip.max(axis=-1), 0)
+
+
+def _cache_keys(machines, priorities):
+    """
+    Builds the cache keys for decoded solutions. Solutions with the same
+    machine assignment and the same order of priorities (including ties) are
+    scheduled identically, so the key consists of the machine indexes and the
+    dense ranks of the priorities.
+
+    @param machines: the machine indexes (solution_length or
+    N x solution_length)
+    @type machines: numpy.ndarray
+    @param priorities: the priorities (same shape as machines)
+    @type priorities: numpy.ndarray
+
+    @return: the key for a single solution or a list of keys for every row
+    @rtype: bytes or list
+    """
+    order = numpy.argsort(priorities, axis=-1, kind="stable")
+    sorted_prio = numpy.take_along_axis(priorities, order, axis=-1)
+    rises = numpy.diff(sorted_prio, axis=-1) > 0.0
+    dense = numpy.zeros(priorities.shape, dtype=numpy.int32)
+    numpy.cumsum(rises, axis=-1, out=dense[..., 1:])
+    ranks = numpy.empty_like(dense)
+    numpy.put_along_axis(ranks, order, dense, axis=-1)
+
+    keys = numpy.concatenate(
+        (machines.astype(numpy.int32), ranks), axis=-1)
+    if keys.ndim == 1:
+        return keys.tobytes()
+    return [row.tobytes() for row in keys]
+
+
+class _MetricsCache(object):
+    """
+    A LRU cache for metric results, that counts its hits and misses.
+    """
+
+    def __init__(self, maxsize):
+        """
+        @param maxsize: the maximum number of stored results
+        @type maxsize: number
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """
+        @return: the stored metrics for the key or None
+        """
+        metrics = self._entries.get(key)
+        if metrics is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return metrics
+
+    def put(self, key, metrics):
+        """
+        Stores the metrics and evicts the least recently used entry if the
+        cache is full.
+        """
+        self._entries[key] = tuple(metrics)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        Removes all entries and resets the statistics.
+        """
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        """
+        @return: the statistics of the cache
+        @rtype: dict
+        """
+        return {"hits": self.hits, "misses": self.misses,
+                "size": len(self._entries), "maxsize": self.maxsize}
+
+
+class _Profile(object):
+    """
+    The profile of a JspEvaluator (see JspEvaluator.profile_stats()).
+    """
+
+    def __init__(self):
+        self.times = {}
+        self.calls = {}
+        self.dispatch_steps = 0
+        self.setup_lookups = 0
+        self.zero_setup_lookups = 0
+
+    def add_time(self, phase, seconds):
+        self.times[phase] = self.times.get(phase, 0.0) + seconds
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+
+    def merge(self, other):
+        """
+        Adds the times and counts of an other profile.
+        """
+        for phase, seconds in other.times.items():
+            self.times[phase] = self.times.get(phase, 0.0) + seconds
+            self.calls[phase] = self.calls.get(phase, 0) + other.calls[phase]
+        self.dispatch_steps += other.dispatch_steps
+        self.setup_lookups += other.setup_lookups
+        self.zero_setup_lookups += other.zero_setup_lookups
+
+    def snapshot(self):
+        return {"time": dict(self.times),
+                "calls": dict(self.calls),
+                "dispatch_steps": self.dispatch_steps,
+                "setup_lookups": {"nonzero": self.setup_lookups,
+                                  "zero": self.zero_setup_lookups}}
+
+
+class IncrementalJspEvaluator(JspEvaluator):
+    """
+    A JspEvaluator for small mutations of a base solution (e.g. in local
+    search). While the base solution is scheduled, the state of the
+    dispatcher is recorded every checkpoint_interval dispatch steps. A mutated
+    solution is only scheduled from the last checkpoint before one of its
+    changed operations becomes available for dispatching, because all
+    dispatch decisions before are the same. The metrics are identical to
+    evaluate().
+    """
+
+    def __init__(self, model, checkpoint_interval=None):
+        """
+        @param model: the model, that shall be used to calculate the metrics
+        @type model: L{jspmodel.JspModel}
+        @param checkpoint_interval: the number of dispatch steps between two
+        checkpoints (default: square root of the solution length)
+        @type checkpoint_interval: number
+        """
+        JspEvaluator.__init__(self, model)
+        if checkpoint_interval is None:
+            checkpoint_interval = int(math.sqrt(model.solution_length()))
+        self.checkpoint_interval = max(1, checkpoint_interval)
+        #: the dispatch step the last (re)evaluation started from
+        self.resumed_step = 0
+        self._base = None
+
+    def set_base(self, solution):
+        """
+        Evaluates a solution completely and records the checkpoints for later
+        calls of reevaluate().
+
+        @param solution: a solution for this model (or its value array)
+        @type solution: L{jspsolution.JspSolution}
+
+        @return: the metric values in the order of get_metrics()
+        @rtype: list
+        """
+        machines, priorities = self._decode_solution(solution)
+        prio_list = priorities.tolist()
+        state = self._new_state(prio_list)
+        checkpoints = []
+        self._run(machines.tolist(), prio_list, state,
+                  checkpoints, self.checkpoint_interval)
+        metrics = self._state_metrics(machines, state)
+
+        self.resumed_step = 0
+        self._set_base(machines, priorities, state.order, checkpoints, metrics)
+        return metrics
+
+    def reevaluate(self, solution, update=True, bounds=None):
+        """
+        Evaluates a (mutated) solution by resuming the scheduling of the base
+        solution from the last checkpoint before the first changed dispatch
+        decision.
+
+        @param solution: a solution for this model (or its value array)
+        @type solution: L{jspsolution.JspSolution}
+        @param update: if True, the solution becomes the new base solution
+        (unless the evaluation is aborted)
+        @type update: bool
+        @param bounds: the upper bound for metrics (see evaluate()), checked
+        at every checkpoint interval
+        @type bounds: dict
+
+        @return: the metric values in the order of get_metrics() or Aborted,
+        if a bound was exceeded
+        @rtype: list
+        """
+        if self._base is None:
+            raise ValueError("there is no base solution (see set_base())")
+        base_machines, base_priorities, order, checkpoints, base_metrics, \
+            avail_steps = self._base
+
+        machines, priorities = self._decode_solution(solution)
+        changed = numpy.flatnonzero((machines != base_machines) |
+                                    (priorities != base_priorities))
+        if bounds is not None:
+            bounds = self._bounds(bounds)
+        if not len(changed):
+            self.resumed_step = len(order)
+            for metric, bound in bounds or ():
+                if base_metrics[METRICS.index(metric)] > bound:
+                    return Aborted(metric, len(order))
+            return list(base_metrics)
+
+        # the first dispatch step, at which a changed operation is available
+        first_step = avail_steps[changed].min()
+        index = first_step // self.checkpoint_interval
+        prio_list = priorities.tolist()
+        state = checkpoints[index].resume(prio_list, order)
+        new_checkpoints = checkpoints[:index] if update else None
+        exceeded = self._run(machines.tolist(), prio_list, state,
+                             new_checkpoints, self.checkpoint_interval, bounds)
+        self.resumed_step = checkpoints[index].step
+        if exceeded is not None:
+            return Aborted(exceeded, state.step)
+
+        metrics = self._state_metrics(machines, state)
+        if update:
+            self._set_base(machines, priorities, state.order,
+                           new_checkpoints, metrics)
+        return metrics
+
+    def _set_base(self, machines, priorities, order, checkpoints, metrics):
+        """
+        Stores the base solution and calculates the dispatch step at which
+        each of its operations becomes available.
+        """
+        length = len(order)
+        position = numpy.empty(length, dtype=numpy.intp)
+        position[order] = numpy.arange(length)
+        # an operation is available right after its predecessor is dispatched,
+        # the first operations of the jobs from the beginning
+        avail_steps = numpy.empty(length, dtype=numpy.intp)
+        avail_steps[1:] = position[:-1] + 1
+        avail_steps[self.model.job_offsets[:-1]] = 0
+
+        self._base = (machines, priorities, order, checkpoints, metrics,
+                      avail_steps)
+
+
+class ParallelJspEvaluator(object):
+    """
+    Evaluates populations on a persistent pool of worker processes. Every
+    worker builds its own JspEvaluator for the model once, when the pool is
+    started, so only the solutions and the metrics are sent afterwards.
+    Populations are split into chunks, whose size is tuned from the measured
+    time per solution (see CHUNK_SECONDS), the metrics are gathered in the
+    order of the population.
+
+    The pool is closed with close() or by using the evaluator as a context
+    manager. To share the setup matrix of a large model between the workers,
+    pass a shared model (see jspmodel.JspModel.shared()).
+    """
+
+    def __init__(self, model, processes=None, chunk_size=None, metrics=None,
+                 cache_size=0, start_method=None):
+        """
+        @param model: the model, that shall be used to calculate the metrics
+        (it is pickled once for every worker)
+        @type model: L{jspmodel.JspModel}
+        @param processes: the number of worker processes (None for the number
+        of cpus)
+        @type processes: number
+        @param chunk_size: the number of solutions per chunk (None to tune it
+        automatically)
+        @type chunk_size: number
+        @param metrics: the metrics to calculate by default (see
+        JspEvaluator)
+        @type metrics: list
+        @param cache_size: the size of the metrics cache of every worker
+        @type cache_size: number
+        @param start_method: the multiprocessing start method ("fork",
+        "spawn" or "forkserver", None for the default)
+        @type start_method: str
+        """
+        self.model = model
+        self.processes = processes or os.cpu_count()
+        self.chunk_size = chunk_size
+        # evaluates single solutions and checks the selections
+        self._evaluator = JspEvaluator(model, metrics=metrics)
+        # the measured wall time per solution in a worker
+        self._solution_seconds = None
+        context = multiprocessing.get_context(start_method)
+        self._pool = context.Pool(
+            self.processes, initializer=_init_worker,
+            initargs=(model, metrics, cache_size))
+
+    def metrics_count(self, metrics=None):
+        """Returns the number of metric values that will be returned by the
+           calculation.
+
+        @param metrics: a metric selection (see evaluate()) or None for the
+        default selection
+        """
+        return self._evaluator.metrics_count(metrics)
+
+    def evaluate(self, solution, metrics=None, bounds=None):
+        """
+        Evaluates a single solution in this process (see
+        JspEvaluator.evaluate()).
+        """
+        return self._evaluator.evaluate(solution, metrics, bounds)
+
+    def evaluate_batch(self, matrix, metrics=None):
+        """
+        Evaluates a whole population on the worker processes (see
+        JspEvaluator.evaluate_batch()).
+
+        @param matrix: the solutions, one per row (N x solution_length)
+        @type matrix: numpy.ndarray
+        @param metrics: the metrics to calculate (see evaluate())
+        @type metrics: list
+
+        @return: the metrics for every solution, one row per solution in the
+        order of the selection (N x metrics_count(metrics))
+        @rtype: numpy.ndarray
+        """
+        selection = self._evaluator._select(metrics)
+        matrix = numpy.asarray(matrix, dtype=numpy.float64)
+        if matrix.ndim != 2 or \
+                matrix.shape[1] != self.model.solution_length():
+            raise ValueError("the solutions do not fit the model (",
+                             self.model.solution_length(),
+                             " operations versus shape ",
+                             matrix.shape, ")")
+        if not len(matrix):
+            return numpy.empty((0, len(selection)))
+
+        size = self._chunk_size(len(matrix))
+        chunks = [(matrix[start:start + size], selection)
+                  for start in range(0, len(matrix), size)]
+        results = self._pool.map(_evaluate_chunk, chunks, chunksize=1)
+
+        seconds = sum(result[1] for result in results) / len(matrix)
+        if self._solution_seconds is None:
+            self._solution_seconds = seconds
+        else:
+            self._solution_seconds = (self._solution_seconds + seconds) / 2
+        return numpy.concatenate([result[0] for result in results])
+
+    def _chunk_size(self, count):
+        """
+        @param count: the number of solutions to evaluate
+        @type count: number
+
+        @return: the fixed chunk size or a chunk size, that takes about
+        CHUNK_SECONDS, but gives every worker CHUNKS_PER_PROCESS chunks
+        @rtype: number
+        """
+        if self.chunk_size is not None:
+            return self.chunk_size
+        size = math.ceil(count / (self.processes * CHUNKS_PER_PROCESS))
+        if self._solution_seconds:
+            size = min(size, int(CHUNK_SECONDS / self._solution_seconds))
+        return max(1, size)
+
+    def close(self):
+        """
+        Stops the worker processes.
+        """
+        self._pool.close()
+        self._pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+#: the evaluator of a worker process of ParallelJspEvaluator
+_WORKER_EVALUATOR = None
+
+
+def _init_worker(model, metrics, cache_size):
+    """
+    Builds the evaluator of a worker process of ParallelJspEvaluator.
+    """
+    global _WORKER_EVALUATOR
+    _WORKER_EVALUATOR = JspEvaluator(model, cache_size, metrics)
+
+
+def _evaluate_chunk(args):
+    """
+    Evaluates a chunk of solutions in a worker process.
+
+    @param args: the solutions and the metric selection
+    @type args: tuple
+
+    @return: the metrics and the wall time in seconds
+    @rtype: numpy.ndarray, number
+    """
+    matrix, selection = args
+    start = time.perf_counter()
+    metrics = _WORKER_EVALUATOR.evaluate_batch(matrix, selection)
+    return metrics, time.perf_counter() - start
+
+
+class _DispatchState(object):
+    """
+    The state of the fused list scheduling between two dispatch steps (see
+    JspEvaluator._run()).
+    """
+    __slots__ = ("step", "machinetime", "last_op", "avail_op", "insertions",
+                 "job_starts", "job_ready", "setuptime", "order")
+
+    def snapshot(self, step, insertions, setuptime):
+        """
+        Creates a checkpoint of the state. The available operations are
+        stored without their priorities, so the checkpoint can be resumed with
+        different priorities.
+
+        @return: a copy of the state
+        @rtype: L{_DispatchState}
+        """
+        checkpoint = self._copy(step, insertions, setuptime)
+        checkpoint.avail_op = [entry[1:] for entry in self.avail_op]
+        checkpoint.order = None
+        return checkpoint
+
+    def resume(self, priorities, order):
+        """
+        Creates a state to continue the scheduling from this checkpoint.
+
+        @param priorities: the priority of every operation
+        @type priorities: list
+        @param order: the dispatch order, that lead to this checkpoint (may be
+        longer)
+        @type order: list
+
+        @return: the state to continue from
+        @rtype: L{_DispatchState}
+        """
+        state = self._copy(self.step, self.insertions, self.setuptime)
+        state.avail_op = [(-priorities[op], insertion, op)
+                          for insertion, op in self.avail_op]
+        heapq.heapify(state.avail_op)
+        state.order = order[:self.step]
+        return state
+
+    def _copy(self, step, insertions, setuptime):
+        """
+        Copies the per machine and per job lists into a new state.
+        """
+        state = _DispatchState()
+        state.step = step
+        state.machinetime = list(self.machinetime)
+        state.last_op = list(self.last_op)
+        state.insertions = insertions
+        state.job_starts = list(self.job_starts)
+        state.job_ready = list(self.job_ready)
+        state.setuptime = setuptime
+        return state
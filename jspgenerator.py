@@ -13,6 +13,10 @@ import ruamel.yaml
 
 XML_HEADER = '<?xml version="1.0" encoding="UTF-8" ?>'
 
+#: the formats of the setuptimes in the generated models: single setuptime
+#: elements, a dense or a compressed setup_matrix or setup_families
+SETUP_FORMATS = ("elements", "dense", "compressed", "families")
+
 
 def randfloat(xmin, xmax):
     """Generates a random float number between xmin (inclusive) and xmax
@@ -37,7 +41,7 @@ def read_yaml(filename):
         file = open(filename, "r")
         content = file.read()
 
-        return content, ruamel.yaml.load(content, ruamel.yaml.RoundTripLoader)
+        return content, ruamel.yaml.YAML(typ="rt").load(content)
     except IOError:
         print("The file: ", filename, " could not be opened.", sep="")
     except ruamel.yaml.parser.ParserError:
@@ -90,6 +94,10 @@ def validate(params):
             if params[pname][0] <= 0:
                 raise ValueError("Parameter: {} less than 1.".format(pname))
 
+    # optional, greater than 0
+    if params.get("setup_families", 1) <= 0:
+        raise ValueError("Parameter: setup_families less than 1.")
+
     # greater or equal to previous value
     geprev = ["operations", "duration", "allowed_machines",
               "weight", "setuptimes", "deadline"]
@@ -106,12 +114,13 @@ def validate(params):
     return True
 
 
-def generate_random_xmltree(params, seed):
+def generate_random_xmltree(params, seed, setup_format="elements"):
     """Generates a xml-tree that represents a jspmodel, that is randomly
     generated in the limits of the parameters.
 
     :params: a dictionary, that contains all the parameters
     :seed: the seed to use for the RNG
+    :setup_format: the format of the setuptimes (see SETUP_FORMATS)
     :returns: an objectified xml-tree
 
     """
@@ -135,19 +144,89 @@ def generate_random_xmltree(params, seed):
     generate_jobs(root, params, machines)
 
     # generate setuptimes
-    e_stimes = etree.SubElement(root, "setuptimes")
-    for e_op1 in root.iter("operation"):
-        for e_op2 in root.iter("operation"):
-            e_st = etree.SubElement(e_stimes, "setuptime")
-            etree.SubElement(e_st, "from_operation").text = \
-                e_op1.attrib["operation_id"]
-            etree.SubElement(e_st, "to_operation").text = \
-                e_op2.attrib["operation_id"]
-            setuptime = randfloat(
-                params["setuptimes"][0],
-                params["setuptimes"][1])
-            etree.SubElement(e_st, "setup_duration").text = \
-                "{:.2f}".format(setuptime)
+    operations = [e_op.attrib["operation_id"]
+                  for e_op in root.iter("operation")]
+    if setup_format == "families":
+        generate_setup_families(root, params, operations)
+    else:
+        setuptimes = [["{:.2f}".format(randfloat(params["setuptimes"][0],
+                                                 params["setuptimes"][1]))
+                       for _ in operations]
+                      for _ in operations]
+        generate_setuptimes(root, operations, setuptimes, setup_format)
+
+    return root
+
+
+def generate_setuptimes(root, operations, setuptimes, setup_format):
+    """generates the setuptimes between all operations into the xml-tree root
+    node.
+
+    :root: the root of the xml tree
+    :operations: the ids of all operations
+    :setuptimes: the formatted setuptimes from every operation to every
+    operation
+    :setup_format: "elements" for single setuptime elements, "dense" or
+    "compressed" for a setup_matrix
+    :returns: the root of the resulting tree
+
+    """
+    if setup_format == "elements":
+        e_stimes = etree.SubElement(root, "setuptimes")
+        for op1, row in zip(operations, setuptimes):
+            for op2, setuptime in zip(operations, row):
+                e_st = etree.SubElement(e_stimes, "setuptime")
+                etree.SubElement(e_st, "from_operation").text = op1
+                etree.SubElement(e_st, "to_operation").text = op2
+                etree.SubElement(e_st, "setup_duration").text = setuptime
+    elif setup_format in ("dense", "compressed"):
+        e_matrix = etree.SubElement(root, "setup_matrix")
+        etree.SubElement(e_matrix, "operation_order").text = \
+            " ".join(operations)
+        for row in setuptimes:
+            if setup_format == "dense":
+                etree.SubElement(e_matrix, "row").text = " ".join(row)
+            else:
+                # only the setuptimes, that are not 0
+                columns = [col for col, setuptime in enumerate(row)
+                           if float(setuptime) != 0.0]
+                e_row = etree.SubElement(e_matrix, "sparse_row")
+                etree.SubElement(e_row, "columns").text = \
+                    " ".join(str(col) for col in columns)
+                etree.SubElement(e_row, "values").text = \
+                    " ".join(row[col] for col in columns)
+    else:
+        raise ValueError("unknown setup format: {}".format(setup_format))
+
+    return root
+
+
+def generate_setup_families(root, params, operations):
+    """generates setup families into the xml-tree root node. Every operation
+    is assigned to a random family, the setuptimes are only generated
+    between different families (0 within a family).
+
+    :root: the root of the xml tree
+    :params: the params from the yaml file (needs setup_families)
+    :operations: the ids of all operations
+    :returns: the root of the resulting tree
+
+    """
+    if "setup_families" not in params:
+        raise ValueError("Parameter: setup_families is required for the "
+                         "families setup format.")
+    count = params["setup_families"]
+
+    e_families = etree.SubElement(root, "setup_families")
+    etree.SubElement(e_families, "operation_order").text = \
+        " ".join(operations)
+    etree.SubElement(e_families, "families").text = " ".join(
+        str(family) for family in random.randint(0, count, len(operations)))
+    for fam1 in range(count):
+        etree.SubElement(e_families, "row").text = " ".join(
+            "0.00" if fam1 == fam2 else "{:.2f}".format(
+                randfloat(params["setuptimes"][0], params["setuptimes"][1]))
+            for fam2 in range(count))
 
     return root
 
@@ -315,13 +394,15 @@ def get_yaml_files(directory):
     return yaml_files
 
 
-def process_yaml(files, output_dir, seed, compression):
+def process_yaml(files, output_dir, seed, compression,
+                 setup_format="elements"):
     """processes all the steps to generate models from the yaml-files.
 
     :files: the yaml files containing the parameters
     :output_dir: the directory to output the models to
     :seed: the seed to use
     :compression: flag - whether to use compression for the output files
+    :setup_format: the format of the setuptimes (see SETUP_FORMATS)
     :returns: None
 
     """
@@ -332,7 +413,7 @@ def process_yaml(files, output_dir, seed, compression):
         validate(param)
 
         # generate the xml
-        xmltree = generate_random_xmltree(param, seed)
+        xmltree = generate_random_xmltree(param, seed, setup_format)
 
         # write the result
         out_filename = "{}/{}.xml".format(
@@ -399,14 +480,15 @@ def main():
 
     """
     usage_string = \
-        "usage: python3 jspgenerator.py -[hsocf] <parameters.yaml, ...>"
+        "usage: python3 jspgenerator.py -[hsocft] <parameters.yaml, ...>"
 
     # read the given parameters
     try:
         options, files = getopt.getopt(
             sys.argv[1:],
-            "hcs:o:f:",
-            ["help", "compression", "seed=", "output-dir=", "format="])
+            "hcs:o:f:t:",
+            ["help", "compression", "seed=", "output-dir=", "format=",
+             "setup-format="])
     except getopt.GetoptError:
         print(usage_string)
         sys.exit(1)
@@ -423,6 +505,9 @@ def main():
     # default format
     fmt = "yaml"
 
+    # default format of the setuptimes
+    setup_format = "elements"
+
     for opt, arg in options:
         if opt in ("-h", "--help"):
             print(usage_string)
@@ -436,13 +521,18 @@ def main():
         elif opt in ("-f", "--format"):
             if arg == "peres":
                 fmt = arg
+        elif opt in ("-t", "--setup-format"):
+            if arg not in SETUP_FORMATS:
+                print(usage_string)
+                sys.exit(1)
+            setup_format = arg
 
     print("saving to: {}".format(output_dir))
 
     if fmt == "peres":
         convert_peres(files, output_dir, compression)
     else:
-        process_yaml(files, output_dir, seed, compression)
+        process_yaml(files, output_dir, seed, compression, setup_format)
 
 
 if __name__ == "__main__":
@@ -4,13 +4,253 @@ on the xml model.
 """
 import sys
 import os.path
+import array
 import gzip
+import hashlib
+import json
+import struct
+import tempfile
+from contextlib import contextmanager
+from multiprocessing import shared_memory
 import numpy
 from lxml import etree
 from lxml import objectify
 sys.path.append(os.path.dirname(__file__))
 from jspsolution import JspSolution
 
+#: the names of the compiled arrays, which hold all model information needed
+#: for the evaluation (operations are indexed globally, like in a solution)
+COMPILED_ARRAYS = (
+    "op_durations",      # duration of every operation
+    "op_jobs",           # job index of every operation
+    "job_offsets",       # global index of every job's first operation
+                         # (+ the total number of operations at the end)
+    "job_releasetimes",  # releasetime of every job
+    "job_deadlines",     # deadline of every job
+    "job_weights",       # weight of every job
+    "job_lotsizes",      # lotsize of every job
+    "allowed_offsets",   # CSR row pointers into allowed_indices
+    "allowed_indices",   # allowed machine indexes of all operations
+)
+
+#: the xml namespace of the model files
+NAMESPACE = "{http://www.htw-dresden.de/JSPeval}"
+
+#: the maximum fraction of given setuptimes, up to which the "auto" storage
+#: uses a sparse setup matrix
+SPARSE_DENSITY = 0.05
+
+#: the magic bytes and the version of the compiled model files (see
+#: JspModel.save_compiled())
+COMPILED_MAGIC = b"JSPMODEL"
+COMPILED_VERSION = 1
+
+#: the alignment of the arrays in the compiled model files
+COMPILED_ALIGNMENT = 64
+
+
+def build_setup_matrix(length, rows, cols, values, storage="auto",
+                       dtype=numpy.float64):
+    """
+    Builds a setup matrix for a model with length operations from the given
+    setuptimes. Setuptimes, that are not given are 0.0. The row index length
+    stands for "no previous operation".
+
+    @param length: the number of operations in the model
+    @type length: number
+    @param rows: the global indexes of the previous operations
+    @param cols: the global indexes of the next operations
+    @param values: the setuptimes
+    @param storage: "dense", "sparse" or "auto"
+    @type storage: str
+    @param dtype: the numpy dtype of the setuptimes
+    @type dtype: numpy.dtype
+
+    @return: the setup matrix ((length + 1) x length)
+    @rtype: numpy.ndarray or L{SparseSetupMatrix}
+    """
+    shape = (length + 1, length)
+    if storage == "auto":
+        sparse = len(values) <= SPARSE_DENSITY * shape[0] * shape[1]
+        storage = "sparse" if sparse else "dense"
+
+    if storage == "sparse":
+        return SparseSetupMatrix(shape, rows, cols, values, dtype)
+    elif storage == "dense":
+        matrix = numpy.zeros(shape, dtype=dtype)
+        matrix[numpy.asarray(rows, dtype=numpy.intp),
+               numpy.asarray(cols, dtype=numpy.intp)] = values
+        return matrix
+    else:
+        raise ValueError("unknown setup storage: {}".format(storage))
+
+
+def read_setup_element(element, operation_ids, storage="auto",
+                       dtype=numpy.float64):
+    """
+    Builds the setup matrix from a compact setup_matrix or setup_families
+    element (see xml/model.xsd), instead of single setuptime elements.
+
+    @param element: the setup_matrix or setup_families element
+    @type element: lxml.etree._Element
+    @param operation_ids: the global index of every operation id
+    @type operation_ids: dict
+    @param storage: "dense", "sparse" or "auto"
+    @type storage: str
+    @param dtype: the numpy dtype of the setuptimes
+    @type dtype: numpy.dtype
+
+    @return: the setup matrix (see build_setup_matrix())
+    @rtype: numpy.ndarray or L{SparseSetupMatrix}
+    """
+    length = len(operation_ids)
+    order = numpy.array(
+        [operation_ids[op_id] for op_id
+         in _numbers(element.find(NAMESPACE + "operation_order"), str)],
+        dtype=numpy.intp)
+    if len(order) != length or \
+            numpy.bincount(order, minlength=length).max() != 1:
+        raise ValueError("the operation_order has to list every operation "
+                         "exactly once")
+    rows = [_numbers(row, numpy.float64)
+            for row in element.iterfind(NAMESPACE + "row")]
+
+    if element.tag == NAMESPACE + "setup_families":
+        families = _numbers(element.find(NAMESPACE + "families"), numpy.intp)
+        if any(len(row) != len(rows) for row in rows) or \
+                len(families) != length or \
+                families.max(initial=0) >= max(len(rows), 1):
+            raise ValueError("the setup families do not fit the family "
+                             "matrix ({} families)".format(len(rows)))
+        matrix = numpy.array(rows)[families[:, None], families]
+    elif rows:
+        if len(rows) != length or any(len(row) != length for row in rows):
+            raise ValueError("the setup matrix has to be {0} x {0}"
+                             .format(length))
+        matrix = numpy.array(rows)
+    else:
+        columns = []
+        values = []
+        for row in element.iterfind(NAMESPACE + "sparse_row"):
+            columns.append(_numbers(row.find(NAMESPACE + "columns"),
+                                    numpy.intp))
+            values.append(_numbers(row.find(NAMESPACE + "values"),
+                                   numpy.float64))
+        counts = [len(row) for row in columns]
+        if len(columns) != length or \
+                counts != [len(row) for row in values] or \
+                numpy.concatenate(columns).max(initial=0) >= length:
+            raise ValueError("the compressed setup matrix does not fit the "
+                             "{} operations".format(length))
+        return build_setup_matrix(
+            length, numpy.repeat(order, counts),
+            order[numpy.concatenate(columns)], numpy.concatenate(values),
+            storage, dtype)
+
+    # translate the declared operation order into the global indexes
+    if storage == "auto":
+        sparse = numpy.count_nonzero(matrix) <= \
+            SPARSE_DENSITY * (length + 1) * length
+        storage = "sparse" if sparse else "dense"
+    if storage == "dense":
+        setuptimes = numpy.zeros((length + 1, length), dtype=dtype)
+        setuptimes[order[:, None], order] = matrix
+        return setuptimes
+    rows, cols = numpy.nonzero(matrix)
+    return build_setup_matrix(length, order[rows], order[cols],
+                              matrix[rows, cols], storage, dtype)
+
+
+class SparseSetupMatrix(object):
+    """ A setup matrix, that only stores the given setuptimes. Provides the
+    same lookup as a dense numpy setup matrix (item(from, to) and
+    [from, to]).
+    """
+
+    def __init__(self, shape, rows, cols, values, dtype=numpy.float64):
+        """
+        Takes the setuptimes in coordinate form.
+
+        @param shape: the shape of the matrix (rows, columns)
+        @param rows: the row index of every setuptime
+        @param cols: the column index of every setuptime
+        @param values: the setuptimes
+        @param dtype: the numpy dtype of the setuptimes
+        """
+        self.shape = tuple(shape)
+        self.dtype = numpy.dtype(dtype)
+        self.rows = numpy.asarray(rows, dtype=numpy.intp)
+        self.cols = numpy.asarray(cols, dtype=numpy.intp)
+        self.values = numpy.asarray(values, dtype=self.dtype)
+        # lookup table, keyed by the flat index of the entries
+        self._lookup = dict(zip(
+            (self.rows * self.shape[1] + self.cols).tolist(),
+            self.values.tolist()))
+        self._sorted = None
+
+    @property
+    def nnz(self):
+        """
+        @return: the number of stored setuptimes
+        @rtype: number
+        """
+        return len(self.values)
+
+    def item(self, row, col):
+        """
+        Returns the setuptime from operation row to operation col as a python
+        float.
+        """
+        return self._lookup.get(row * self.shape[1] + col, 0.0)
+
+    def __getitem__(self, key):
+        row, col = key
+        return self.dtype.type(self.item(row, col))
+
+    def lookup(self, rows, cols):
+        """
+        Looks up many setuptimes at once (like dense[rows, cols]).
+
+        @param rows: the previous operations
+        @type rows: numpy.ndarray
+        @param cols: the next operations
+        @type cols: numpy.ndarray
+
+        @return: the setuptimes as float64
+        @rtype: numpy.ndarray
+        """
+        if self._sorted is None:
+            # sorted keys and values of the lookup table for binary searches
+            keys = numpy.fromiter(self._lookup.keys(), dtype=numpy.int64,
+                                  count=len(self._lookup))
+            values = numpy.fromiter(self._lookup.values(),
+                                    dtype=numpy.float64,
+                                    count=len(self._lookup))
+            index = numpy.argsort(keys)
+            self._sorted = (numpy.append(keys[index], -1),
+                            numpy.append(values[index], 0.0))
+        keys, values = self._sorted
+        flat = numpy.asarray(rows) * self.shape[1] + numpy.asarray(cols)
+        found = numpy.searchsorted(keys[:-1], flat)
+        # missing entries point to the appended 0.0
+        found[keys[found] != flat] = len(keys) - 1
+        return values[found]
+
+    def __reduce__(self):
+        """
+        Pickles only the coordinates, the lookup table is rebuilt.
+        """
+        return (SparseSetupMatrix,
+                (self.shape, self.rows, self.cols, self.values, self.dtype))
+
+    def toarray(self):
+        """
+        @return: the setup matrix as a dense numpy array
+        @rtype: numpy.ndarray
+        """
+        return build_setup_matrix(self.shape[1], self.rows, self.cols,
+                                  self.values, "dense", self.dtype)
+
 
 class JspModel(object):
     """ Reads all model information from a xml file. Provides solution
@@ -19,58 +259,395 @@ class JspModel(object):
     setuptimes for the operations (get_setuptime()).
     """
 
-    def __init__(self, filename):
+    #: the shared memory block, the layout of the arrays in it and the setup
+    #: matrix description of a shared model (see shared())
+    _shared = None
+
+    def __init__(self, filename, keep_tree=True, setup_storage="auto",
+                 setup_dtype=numpy.float64, setup_mmap=None, streaming=False,
+                 cache=None):
         """
         Takes the xml-File, that describes the model and builds all necessary
         datastructures. When a JspModel is given this acts as a copy
         constructor.
+
+        @param filename: the xml-file (may be gzipped) or a JspModel to copy
+        @param keep_tree: if False the objectified xml tree is dropped after
+        the model is compiled (see drop_tree())
+        @type keep_tree: bool
+        @param setup_storage: the storage of the setup matrix, "dense",
+        "sparse" or "auto" (see _create_setuptimes())
+        @type setup_storage: str
+        @param setup_dtype: the dtype of the setuptimes (float32 or float64)
+        @type setup_dtype: numpy.dtype
+        @param setup_mmap: a .npy file to memory-map the setup matrix from. If
+        it does not exist, it is written first (see map_setuptimes())
+        @type setup_mmap: str
+        @param streaming: if True, the xml file is parsed incrementally and
+        the compiled arrays are built directly, without an xml tree (see
+        _stream()). keep_tree is ignored then.
+        @type streaming: bool
+        @param cache: a compiled model file (True for the xml filename with the
+        suffix ".compiled"). If it belongs to the xml file, the model is
+        memory-mapped from it instead of parsing the xml file, otherwise it is
+        written after parsing (see save_compiled()). The model has no xml tree
+        either way, keep_tree is ignored then.
+        @type cache: str or bool
         """
         if isinstance(filename, JspModel):
             self.model = filename.model
+            for name in COMPILED_ARRAYS:
+                setattr(self, name, getattr(filename, name))
+            self.machine_count = filename.machine_count
+            self.allowed_counts = filename.allowed_counts
             self.index_translation_list = filename.index_translation_list
             self.allowed_machines = filename.allowed_machines
             self.setuptimes = filename.setuptimes
         else:
-            # read the xml schema and build a parser from it
-            schemafile = "{}/xml/model.xsd".format(os.path.dirname(__file__))
-            schema = etree.XMLSchema(file=open(schemafile, "r"))
-            parser = objectify.makeparser(schema=schema)
-
-            # read the model and build objects from it
-            if filename.endswith(".gz"):
-                modelfile = gzip.open(filename, 'r')
+            if cache is True:
+                cache = "{}.compiled".format(filename)
+            if cache and self._read_cache(cache, filename, setup_storage,
+                                          setup_dtype):
+                if setup_mmap is not None:
+                    self.map_setuptimes(setup_mmap)
             else:
-                modelfile = open(filename, 'r')
+                self._parse(filename, setup_storage, setup_dtype, setup_mmap,
+                            streaming)
+                if cache:
+                    self.save_compiled(cache, filename)
 
-            self.model = objectify.parse(modelfile, parser).getroot()
             # prebuild the index translation list
             self.index_translation_list = self._create_index_translation_list()
             # provide a translated list of the allowed machines for every
             # operation
             self.allowed_machines = self._create_allowed_machines_list()
-            # create a setupmatrix between all operations (indexed globally)
-            self.setuptimes = self._create_setuptimes()
+
+            # a cached model never has a tree, so it is dropped after parsing
+            # as well
+            if not keep_tree or cache:
+                self.drop_tree()
+
+    @classmethod
+    def from_peres(cls, filename, setup_storage="auto",
+                   setup_dtype=numpy.float64):
+        """
+        Reads a model in the Dauzere Peres et al. format (plain or gzipped)
+        directly into the compiled arrays, without converting it to xml (see
+        jspgenerator.read_peres()). The first line holds the number of jobs
+        and machines, every following line a job: releasetime, deadline,
+        weight, the number of operations and a (machine, duration) pair for
+        every operation (machines are numbered from 1). The model has no xml
+        tree and no setuptimes; lotsizes are 1.
+
+        @param filename: the model file in the Peres format
+        @type filename: str
+        @param setup_storage: the storage of the (empty) setup matrix
+        @type setup_storage: str
+        @param setup_dtype: the dtype of the setuptimes
+        @type setup_dtype: numpy.dtype
+
+        @return: the model
+        @rtype: L{JspModel}
+        """
+        opener = gzip.open if filename.endswith(".gz") else open
+        with opener(filename, "rt") as peres_file:
+            lines = [line.split() for line in peres_file if line.strip()]
+        job_count, machine_count = int(lines[0][0]), int(lines[0][1])
+        if len(lines) <= job_count:
+            raise ValueError("{} holds {} of {} jobs".format(
+                filename, len(lines) - 1, job_count))
+
+        durations = []
+        allowed_indices = []
+        op_counts = []
+        jobs = []
+        for values in lines[1:job_count + 1]:
+            jobs.append(values[:3])
+            op_count = int(values[3])
+            pairs = values[4:4 + 2 * op_count]
+            if len(pairs) != 2 * op_count:
+                raise ValueError("the job {} in {} lacks operations".format(
+                    len(jobs) - 1, filename))
+            allowed_indices.extend(int(machine) - 1
+                                   for machine in pairs[0::2])
+            durations.extend(pairs[1::2])
+            op_counts.append(op_count)
+
+        model = cls.__new__(cls)
+        model.model = None
+        model.machine_count = machine_count
+        jobs = numpy.array(jobs, dtype=numpy.float64).reshape(-1, 3)
+        model.job_releasetimes = jobs[:, 0].copy()
+        model.job_deadlines = jobs[:, 1].copy()
+        model.job_weights = jobs[:, 2].copy()
+        model.job_lotsizes = numpy.ones(job_count, dtype=numpy.int64)
+        model.job_offsets = numpy.concatenate(
+            ([0], numpy.cumsum(op_counts))).astype(numpy.intp)
+        model.op_durations = numpy.array(durations, dtype=numpy.float64)
+        model.op_jobs = numpy.repeat(
+            numpy.arange(job_count, dtype=numpy.intp), op_counts)
+        model.allowed_indices = numpy.array(allowed_indices, dtype=numpy.intp)
+        # every operation is allowed on exactly one machine
+        model.allowed_offsets = numpy.arange(len(durations) + 1,
+                                             dtype=numpy.intp)
+        model.allowed_counts = numpy.diff(model.allowed_offsets)
+        if model.allowed_indices.size and \
+                not 0 <= model.allowed_indices.min() <= \
+                model.allowed_indices.max() < machine_count:
+            raise ValueError("the machines in {} have to be numbered from 1 "
+                             "to {}".format(filename, machine_count))
+
+        model.setuptimes = build_setup_matrix(
+            len(durations), [], [], [], setup_storage, setup_dtype)
+        model.index_translation_list = model._create_index_translation_list()
+        model.allowed_machines = model._create_allowed_machines_list()
+        return model
+
+    def _parse(self, filename, setup_storage, setup_dtype, setup_mmap,
+               streaming):
+        """
+        Reads the model from the xml file (see __init__()) and builds the
+        compiled arrays and the setup matrix.
+        """
+        # read the xml schema
+        schemafile = "{}/xml/model.xsd".format(os.path.dirname(__file__))
+        schema = etree.XMLSchema(file=open(schemafile, "r"))
+        map_only = setup_mmap is not None and os.path.exists(setup_mmap)
+
+        # read the model and build objects from it
+        if filename.endswith(".gz"):
+            modelfile = gzip.open(filename, 'r')
+        else:
+            modelfile = open(filename, 'rb' if streaming else 'r')
+
+        if streaming:
+            self.model = None
+            # build the flat arrays while parsing
+            setuptimes = self._stream(modelfile, schema, setup_storage,
+                                      setup_dtype, not map_only)
+        else:
+            parser = objectify.makeparser(schema=schema)
+            self.model = objectify.parse(modelfile, parser).getroot()
+            # convert the tree into flat arrays
+            self._compile()
+        modelfile.close()
+
+        # create a setupmatrix between all operations (indexed globally)
+        if map_only:
+            self.map_setuptimes(setup_mmap)
+        else:
+            if streaming:
+                self.setuptimes = setuptimes
+            else:
+                self.setuptimes = self._create_setuptimes(setup_storage,
+                                                          setup_dtype)
+            if setup_mmap is not None:
+                self.map_setuptimes(setup_mmap)
 
     def __getattr__(self, name):
         """
         Forwards the getter to a ObjectifiedObject of the model.
         """
         mdl = object.__getattribute__(self, 'model')
+        if mdl is None:
+            raise AttributeError(
+                "'{}' is not compiled and the xml tree was dropped"
+                .format(name))
         return getattr(mdl, name)
 
+    def _compile(self):
+        """
+        Reads all numbers the evaluation needs from the objectified tree
+        (once) and stores them as flat numpy arrays (see COMPILED_ARRAYS).
+        Operations are stored in global index order.
+        """
+        machine_ids = {machine.get("machine_id"): idx
+                       for idx, machine in enumerate(self.model.machine)}
+        self.machine_count = len(machine_ids)
+
+        durations = []
+        op_jobs = []
+        job_offsets = [0]
+        releasetimes = []
+        deadlines = []
+        weights = []
+        lotsizes = []
+        allowed_offsets = [0]
+        allowed_indices = []
+        for jobnum, job in enumerate(self.model.job):
+            releasetimes.append(float(job.releasetime))
+            deadlines.append(float(job.deadline))
+            weights.append(float(job.weight))
+            lotsizes.append(int(job.lotsize))
+            for operation in job.operation:
+                durations.append(float(operation.op_duration))
+                op_jobs.append(jobnum)
+                allowed_indices.extend(machine_ids[m_name.text] for m_name
+                                       in operation.allowed_machine)
+                allowed_offsets.append(len(allowed_indices))
+            job_offsets.append(len(durations))
+
+        self.op_durations = numpy.array(durations, dtype=numpy.float64)
+        self.op_jobs = numpy.array(op_jobs, dtype=numpy.intp)
+        self.job_offsets = numpy.array(job_offsets, dtype=numpy.intp)
+        self.job_releasetimes = numpy.array(releasetimes, dtype=numpy.float64)
+        self.job_deadlines = numpy.array(deadlines, dtype=numpy.float64)
+        self.job_weights = numpy.array(weights, dtype=numpy.float64)
+        self.job_lotsizes = numpy.array(lotsizes, dtype=numpy.int64)
+        self.allowed_offsets = numpy.array(allowed_offsets, dtype=numpy.intp)
+        self.allowed_indices = numpy.array(allowed_indices, dtype=numpy.intp)
+        # the number of allowed machines for every operation
+        self.allowed_counts = numpy.diff(self.allowed_offsets)
+
+    def _stream(self, modelfile, schema, storage="auto",
+                dtype=numpy.float64, read_setuptimes=True):
+        """
+        Parses the model incrementally (validating it against the schema) and
+        builds the compiled arrays (see _compile()) directly. Every machine,
+        job and setuptime element is released as soon as it is read, so the
+        memory stays proportional to the compiled arrays instead of the xml
+        tree. Gzipped files are decompressed as a stream.
+
+        @param modelfile: the opened (binary) model file
+        @param schema: the xml schema of the model files
+        @type schema: lxml.etree.XMLSchema
+        @param storage: the storage of the setup matrix (see
+        build_setup_matrix())
+        @type storage: str
+        @param dtype: the dtype of the setuptimes
+        @type dtype: numpy.dtype
+        @param read_setuptimes: if False, the setuptimes are only validated
+        (e.g. if the setup matrix is mapped from a file)
+        @type read_setuptimes: bool
+
+        @return: the setup matrix (None, if read_setuptimes is False)
+        @rtype: numpy.ndarray or L{SparseSetupMatrix}
+        """
+        machine_ids = {}
+        operation_ids = {}
+        durations = array.array("d")
+        op_jobs = array.array("q")
+        job_offsets = array.array("q", [0])
+        releasetimes = array.array("d")
+        deadlines = array.array("d")
+        weights = array.array("d")
+        lotsizes = array.array("q")
+        allowed_offsets = array.array("q", [0])
+        allowed_indices = array.array("q")
+        rows = array.array("q")
+        cols = array.array("q")
+        values = array.array("d")
+        setuptimes = None
+
+        machine_tag = NAMESPACE + "machine"
+        job_tag = NAMESPACE + "job"
+        setuptime_tag = NAMESPACE + "setuptime"
+        # comments and processing instructions are dropped, so the children
+        # can be read by their position
+        events = etree.iterparse(
+            modelfile, events=("end",), schema=schema, remove_comments=True,
+            remove_pis=True,
+            tag=(machine_tag, job_tag, setuptime_tag,
+                 NAMESPACE + "setup_matrix", NAMESPACE + "setup_families"))
+        for _, element in events:
+            try:
+                if element.tag == machine_tag:
+                    machine_ids[element.get("machine_id")] = len(machine_ids)
+                elif element.tag == job_tag:
+                    # the children are ordered by the schema: releasetime,
+                    # deadline, weight, lotsize and the operations
+                    releasetimes.append(float(element[0].text))
+                    deadlines.append(float(element[1].text))
+                    weights.append(float(element[2].text))
+                    lotsizes.append(int(element[3].text))
+                    for operation in element.iterchildren(
+                            NAMESPACE + "operation"):
+                        operation_ids[operation.get("operation_id")] = \
+                            len(durations)
+                        durations.append(float(operation[0].text))
+                        op_jobs.append(len(releasetimes) - 1)
+                        allowed_indices.extend(machine_ids[m_name.text]
+                                               for m_name in operation[1:])
+                        allowed_offsets.append(len(allowed_indices))
+                    job_offsets.append(len(durations))
+                elif not read_setuptimes:
+                    pass
+                elif element.tag == setuptime_tag:
+                    # from_operation, to_operation and setup_duration
+                    rows.append(operation_ids[element[0].text])
+                    cols.append(operation_ids[element[1].text])
+                    values.append(float(element[2].text))
+                else:
+                    setuptimes = read_setup_element(element, operation_ids,
+                                                    storage, dtype)
+            except (ValueError, KeyError, IndexError, TypeError):
+                # the parser reads ahead, so the validation error of an
+                # invalid element is raised later
+                for _ in events:
+                    pass
+                raise
+
+            # release the element and its already processed siblings
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+        self.machine_count = len(machine_ids)
+        self.op_durations = numpy.frombuffer(durations, dtype=numpy.float64)
+        self.op_jobs = numpy.frombuffer(op_jobs, dtype=numpy.int64).astype(
+            numpy.intp)
+        self.job_offsets = numpy.frombuffer(
+            job_offsets, dtype=numpy.int64).astype(numpy.intp)
+        self.job_releasetimes = numpy.frombuffer(
+            releasetimes, dtype=numpy.float64)
+        self.job_deadlines = numpy.frombuffer(deadlines, dtype=numpy.float64)
+        self.job_weights = numpy.frombuffer(weights, dtype=numpy.float64)
+        self.job_lotsizes = numpy.frombuffer(lotsizes, dtype=numpy.int64)
+        self.allowed_offsets = numpy.frombuffer(
+            allowed_offsets, dtype=numpy.int64).astype(numpy.intp)
+        self.allowed_indices = numpy.frombuffer(
+            allowed_indices, dtype=numpy.int64).astype(numpy.intp)
+        # the number of allowed machines for every operation
+        self.allowed_counts = numpy.diff(self.allowed_offsets)
+
+        if not read_setuptimes or setuptimes is not None:
+            return setuptimes
+        return build_setup_matrix(
+            len(durations), numpy.frombuffer(rows, dtype=numpy.int64),
+            numpy.frombuffer(cols, dtype=numpy.int64),
+            numpy.frombuffer(values, dtype=numpy.float64), storage, dtype)
+
+    def drop_tree(self):
+        """
+        Releases the objectified xml tree. Everything needed for evaluation is
+        held in the compiled arrays, only attribute access to the raw xml
+        elements (e.g. model.job) is not possible anymore.
+        """
+        self.model = None
+
+    def has_tree(self):
+        """
+        @return: True if the objectified xml tree is still available
+        @rtype: bool
+        """
+        return self.model is not None
+
+    def job_count(self):
+        """
+        @return: the number of jobs in the model
+        @rtype: number
+        """
+        return len(self.job_releasetimes)
+
     def _create_allowed_machines_list(self):
         """
         Creates a dictionary which contains the ids of all allowed machines for
         every operation.
         """
-        machine_ids = [machine.get("machine_id")
-                       for machine in self.model.machine]
         allowed_machines = {}
-        for i, _ in enumerate(self.model.job):
-            for j, operation in enumerate(self.model.job[i].operation):
-                allowed = [machine_ids.index(m_name.text) for m_name in
-                           operation.allowed_machine]
-                allowed_machines[(i, j)] = allowed
+        for index, op_id in enumerate(self.index_translation_list):
+            start, end = self.allowed_offsets[index:index + 2]
+            allowed_machines[op_id] = self.allowed_indices[start:end].tolist()
 
         return allowed_machines
 
@@ -92,36 +669,294 @@ class JspModel(object):
         """
         translation_list = []
 
-        for i, _ in enumerate(self.model.job):
-            for j, _ in enumerate(self.model.job[i].operation):
+        for i in range(self.job_count()):
+            for j in range(self.job_offsets[i + 1] - self.job_offsets[i]):
                 translation_list.append((i, j))
 
         return translation_list
 
-    def _create_setuptimes(self):
+    def _create_setuptimes(self, storage, dtype):
         """
-        This function creates a dictionary, which contains all operations
-        (globally indexed) and stores the setuptime to each.
+        This function creates the setup matrix between all operations
+        (globally indexed). Row i holds the setuptimes from operation i to
+        every other operation. The additional last row holds the setuptimes
+        for machines, that did not process any operation yet.
+
+        @param storage: "dense", "sparse" or "auto" (sparse if less than
+        SPARSE_DENSITY of the setuptimes are given)
+        @type storage: str
+        @param dtype: the numpy dtype of the setuptimes
+        @type dtype: numpy.dtype
+
+        @return: the setup matrix ((solution_length + 1) x solution_length)
+        @rtype: numpy.ndarray or L{SparseSetupMatrix}
         """
+        # create a translationdictionary for the operation's names
+        operationnames = {}
+        for operation in self.model.iterfind(".//{*}operation"):
+            operationnames[operation.get("operation_id")] = \
+                len(operationnames)
 
+        # a compact setup matrix
+        for tag in ("setup_matrix", "setup_families"):
+            element = self.model.find(NAMESPACE + tag)
+            if element is not None:
+                return read_setup_element(element, operationnames, storage,
+                                          dtype)
+
+        rows = []
+        cols = []
+        values = []
         try:
-            # create a translationdictionary for the operation's names
-            operationnames = {}
-            for i, _ in enumerate(self.model.job):
-                for j, operation in enumerate(self.model.job[i].operation):
-                    operationnames[operation.get("operation_id")] = (i, j)
-
-            # create a setuptimes dictionary, which uses the names as key
-            namedsetuptimes =\
-                {(s.from_operation, s.to_operation): s.setup_duration
-                 for s in self.model.setuptimes.setuptime}
-
-            # assemble the globally indexed list
-            return {(operationnames[name[0]], operationnames[name[1]]):
-                    namedsetuptimes[name]
-                    for name in namedsetuptimes.keys()}
+            for stime in self.model.setuptimes.setuptime:
+                rows.append(operationnames[stime.from_operation.text])
+                cols.append(operationnames[stime.to_operation.text])
+                values.append(float(stime.setup_duration))
         except AttributeError:
-            return {}
+            pass
+
+        return build_setup_matrix(self.solution_length(), rows, cols, values,
+                                  storage, dtype)
+
+    def save_setuptimes(self, filename):
+        """
+        Writes the setup matrix densely to a .npy file. The file is replaced
+        atomically, so processes mapping it never see a partial matrix.
+
+        @param filename: the name of the .npy file
+        @type filename: str
+        """
+        directory = os.path.dirname(os.path.abspath(filename))
+        handle, tmpname = tempfile.mkstemp(dir=directory, suffix=".npy")
+        try:
+            with os.fdopen(handle, "wb") as tmpfile:
+                numpy.save(tmpfile, _dense(self.setuptimes))
+            os.replace(tmpname, filename)
+        except BaseException:
+            os.remove(tmpname)
+            raise
+
+    def map_setuptimes(self, filename):
+        """
+        Backs the setup matrix with a memory-mapped .npy file (read only). All
+        processes mapping the same file share one copy in the page cache. If
+        the file does not exist, the current setup matrix is written to it
+        first.
+
+        @param filename: the name of the .npy file
+        @type filename: str
+        """
+        if not os.path.exists(filename):
+            self.save_setuptimes(filename)
+
+        setuptimes = numpy.load(filename, mmap_mode="r")
+        shape = (self.solution_length() + 1, self.solution_length())
+        if setuptimes.shape != shape:
+            raise ValueError("the setup matrix in {} does not fit the model "
+                             "({} versus {})".format(
+                                 filename, setuptimes.shape, shape))
+        self.setuptimes = setuptimes
+
+    def save_compiled(self, filename, source=None):
+        """
+        Writes the compiled arrays and the setup matrix to a binary file: a
+        small json header followed by the raw arrays, so they can be
+        memory-mapped when the model is loaded again (see __init__()). The
+        file is replaced atomically.
+
+        @param filename: the name of the compiled model file
+        @type filename: str
+        @param source: the xml file of the model. Its size, modification time
+        and content hash are stored to detect outdated files.
+        @type source: str
+        """
+        self._write_compiled(
+            filename, None if source is None else _source_info(source))
+
+    def _write_compiled(self, filename, source_info):
+        """
+        Writes the compiled model file (see save_compiled()).
+
+        @param filename: the name of the compiled model file
+        @type filename: str
+        @param source_info: the size, modification time and content hash of
+        the xml file (see _source_info())
+        @type source_info: dict
+        """
+        setup, arrays = self._raw_arrays()
+        header = {"version": COMPILED_VERSION,
+                  "source": source_info,
+                  "machine_count": self.machine_count,
+                  "setup": setup,
+                  "arrays": _layout(arrays)[0]}
+        content = json.dumps(header, sort_keys=True).encode("utf8")
+        start = _aligned(len(COMPILED_MAGIC) + 8 + len(content))
+
+        directory = os.path.dirname(os.path.abspath(filename))
+        handle, tmpname = tempfile.mkstemp(dir=directory, suffix=".compiled")
+        try:
+            with os.fdopen(handle, "wb") as tmpfile:
+                tmpfile.write(COMPILED_MAGIC)
+                tmpfile.write(struct.pack("<Q", len(content)))
+                tmpfile.write(content)
+                for name, values in arrays:
+                    tmpfile.seek(start + header["arrays"][name]["offset"])
+                    tmpfile.write(numpy.ascontiguousarray(values).tobytes())
+            os.replace(tmpname, filename)
+        except BaseException:
+            os.remove(tmpname)
+            raise
+
+    def _read_cache(self, filename, source, setup_storage, setup_dtype):
+        """
+        Memory-maps the compiled arrays and the setup matrix from a compiled
+        model file (see save_compiled()), if it belongs to the source file:
+        its size and modification time or else its content hash have to
+        match. The setup matrix has to fit the requested storage and dtype.
+
+        @return: True, if the model was read from the compiled file
+        @rtype: bool
+        """
+        try:
+            with open(filename, "rb") as cachefile:
+                if cachefile.read(len(COMPILED_MAGIC)) != COMPILED_MAGIC:
+                    return False
+                length = struct.unpack("<Q", cachefile.read(8))[0]
+                header = json.loads(cachefile.read(length).decode("utf8"))
+                size = os.fstat(cachefile.fileno()).st_size
+        except (IOError, ValueError, struct.error):
+            return False
+        start = _aligned(len(COMPILED_MAGIC) + 8 + length)
+
+        if header.get("version") != COMPILED_VERSION:
+            return False
+        setup = header["setup"]
+        if setup_storage not in ("auto", setup["storage"]) or \
+                numpy.dtype(setup_dtype) != numpy.dtype(setup["dtype"]):
+            return False
+        stored = header["source"]
+        if stored is None:
+            return False
+        current = _source_info(source, with_hash=False)
+        refresh = (current["size"], current["mtime_ns"]) != \
+            (stored["size"], stored["mtime_ns"])
+        if refresh:
+            current["sha256"] = file_hash(source)
+            if current["sha256"] != stored["sha256"]:
+                return False
+
+        arrays = {}
+        try:
+            for name, info in header["arrays"].items():
+                shape = tuple(info["shape"])
+                dtype = numpy.dtype(info["dtype"])
+                if numpy.prod(shape) == 0:
+                    arrays[name] = numpy.empty(shape, dtype=dtype)
+                elif start + info["offset"] + \
+                        int(numpy.prod(shape)) * dtype.itemsize > size:
+                    # the file is truncated
+                    return False
+                else:
+                    arrays[name] = numpy.memmap(
+                        filename, dtype=dtype, mode="r",
+                        offset=start + info["offset"], shape=shape)
+        except (KeyError, TypeError, ValueError):
+            # a damaged header
+            return False
+
+        self._restore(arrays, header["machine_count"], setup)
+        if refresh:
+            # the content is unchanged (e.g. the file was touched or copied):
+            # store the new size and modification time, so the next load
+            # does not hash the file again
+            self._write_compiled(filename, current)
+        return True
+
+    def _raw_arrays(self):
+        """
+        Lists the compiled arrays and the arrays of the setup matrix (see
+        save_compiled() and shared()).
+
+        @return: the storage and dtype of the setup matrix and the (name,
+        array) pairs
+        @rtype: dict, list
+        """
+        arrays = [(name, getattr(self, name)) for name in COMPILED_ARRAYS]
+        if isinstance(self.setuptimes, SparseSetupMatrix):
+            setup = {"storage": "sparse",
+                     "dtype": self.setuptimes.dtype.str}
+            arrays.extend([("setup_rows", self.setuptimes.rows),
+                           ("setup_cols", self.setuptimes.cols),
+                           ("setup_values", self.setuptimes.values)])
+        else:
+            setup = {"storage": "dense", "dtype": self.setuptimes.dtype.str}
+            arrays.append(("setuptimes", self.setuptimes))
+        return setup, arrays
+
+    def _restore(self, arrays, machine_count, setup):
+        """
+        Sets the compiled arrays and the setup matrix from the arrays listed
+        by _raw_arrays(). The model has no xml tree afterwards.
+
+        @param arrays: the arrays by their names
+        @type arrays: dict
+        @param machine_count: the number of machines
+        @type machine_count: number
+        @param setup: the storage and dtype of the setup matrix
+        @type setup: dict
+        """
+        self.model = None
+        for name in COMPILED_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.machine_count = machine_count
+        self.allowed_counts = numpy.diff(self.allowed_offsets)
+        if setup["storage"] == "sparse":
+            self.setuptimes = SparseSetupMatrix(
+                (self.solution_length() + 1, self.solution_length()),
+                arrays["setup_rows"], arrays["setup_cols"],
+                arrays["setup_values"], setup["dtype"])
+        else:
+            self.setuptimes = arrays["setuptimes"]
+
+    @contextmanager
+    def shared(self):
+        """
+        Places the compiled arrays and the setup matrix in one shared memory
+        block (multiprocessing.shared_memory) for the duration of a with
+        block and yields a model (without xml tree), whose arrays are views
+        of the block. This model is pickled by the name of the block, so
+        worker processes attach to the block instead of receiving private
+        copies (see __getstate__()). The lookup table of a sparse setup matrix
+        is still built in every process.
+
+        The block is unlinked, when the with block is left (also on errors),
+        the shared model must not be used afterwards.
+
+        @return: the shared model
+        @rtype: L{JspModel}
+        """
+        setup, arrays = self._raw_arrays()
+        layout, size = _layout(arrays)
+        block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            views = _views(block, layout)
+            for name, values in arrays:
+                views[name][...] = values
+            model = JspModel.__new__(JspModel)
+            model._restore(views, self.machine_count, setup)
+            model.index_translation_list = self.index_translation_list
+            model.allowed_machines = self.allowed_machines
+            model._shared = (block, layout, setup)
+            del views
+            yield model
+        finally:
+            block.unlink()
+            try:
+                block.close()
+            except BufferError:
+                # arrays of the block are still referenced, the mapping is
+                # released with them
+                pass
 
     def solution_length(self):
         """
@@ -131,9 +966,7 @@ class JspModel(object):
         @return: the calculated length
         @rtype: number
         """
-        return sum(
-            [len([op.tag for op in job.operation]) for job in self.model.job]
-        )
+        return len(self.op_durations)
 
     def get_random_solution(self):
         """
@@ -166,24 +999,33 @@ class JspModel(object):
         """
         Returns the setuptime between two operations or 0.0 if there isnt any.
 
+        @param op_from: the (job, op) tuple of the previous operation or None
+        if the machine did not process any operation yet
+        @param op_to: the (job, op) tuple of the next operation
+
         @return: the setuptime
         @rtype: number
         """
-        op_tuple = (op_from, op_to)
-        if op_tuple in self.setuptimes:
-            return self.setuptimes[op_tuple]
+        if op_from is None:
+            from_idx = self.solution_length()
         else:
-            return 0.0
+            from_idx = int(self.job_offsets[op_from[0]]) + op_from[1]
+        to_idx = int(self.job_offsets[op_to[0]]) + op_to[1]
+
+        return self.setuptimes.item(from_idx, to_idx)
 
     def __eq__(self, other):
-        """Implements a comparison of 2 JspModels.
+        """Implements a comparison of 2 JspModels. If one of the xml trees was
+        dropped, the compiled arrays are compared.
 
         :other: the JspModel to compare to.
         :returns: a boolean value, True if the models are equal from a xml
         standpoint
 
         """
-        return _xmleq(self.model, other.model)
+        if self.has_tree() and other.has_tree():
+            return _xmleq(self.model, other.model)
+        return _compiledeq(self, other)
 
     def __ne__(self, other):
         """Implements a comparison of 2 JspModels.
@@ -193,7 +1035,7 @@ class JspModel(object):
         standpoint
 
         """
-        return not _xmleq(self.model, other.model)
+        return not self == other
 
     def __deepcopy__(self, memo):
         """Custom deepcopy because of __getattr__().
@@ -204,6 +1046,198 @@ class JspModel(object):
         """
         return JspModel(self)
 
+    def __copy__(self):
+        """Custom copy, that keeps the xml tree (unlike pickling).
+
+        :returns: a copy of the model
+
+        """
+        return JspModel(self)
+
+    def __getstate__(self):
+        """Pickles only the compiled arrays and the setup matrix, neither the
+        xml tree nor the lists derived from the arrays. Memory-mapped arrays
+        are pickled by value, shared arrays (see shared()) by the name of
+        their shared memory block.
+
+        :returns: the state of the model
+
+        """
+        if self._shared is not None:
+            block, layout, setup = self._shared
+            return {"shared_block": block.name, "layout": layout,
+                    "setup": setup, "machine_count": self.machine_count}
+
+        state = {name: numpy.asarray(getattr(self, name))
+                 for name in COMPILED_ARRAYS}
+        state["machine_count"] = self.machine_count
+        if isinstance(self.setuptimes, SparseSetupMatrix):
+            state["setuptimes"] = self.setuptimes
+        else:
+            state["setuptimes"] = numpy.asarray(self.setuptimes)
+        return state
+
+    def __setstate__(self, state):
+        """Rebuilds an unpickled model from the compiled arrays (without the
+        xml tree, see __getstate__()).
+
+        :state: the state of the model
+        :returns: None
+
+        """
+        if "shared_block" in state:
+            # attach to the shared memory block (zero-copy)
+            block = _attach(state["shared_block"])
+            self._restore(_views(block, state["layout"]),
+                          state["machine_count"], state["setup"])
+            self._shared = (block, state["layout"], state["setup"])
+        else:
+            self.model = None
+            for name in COMPILED_ARRAYS:
+                setattr(self, name, state[name])
+            self.machine_count = state["machine_count"]
+            self.setuptimes = state["setuptimes"]
+            self.allowed_counts = numpy.diff(self.allowed_offsets)
+        self.index_translation_list = self._create_index_translation_list()
+        self.allowed_machines = self._create_allowed_machines_list()
+
+
+def _compiledeq(model1, model2):
+    """Compares the compiled representations of 2 JspModels.
+
+    :model1: first model of the comparison
+    :model2: second model of the comparison
+    :returns: boolean value, True if all compiled arrays and the setuptimes are
+    equal
+
+    """
+    if model1.machine_count != model2.machine_count:
+        return False
+    for name in COMPILED_ARRAYS:
+        if not numpy.array_equal(getattr(model1, name), getattr(model2, name)):
+            return False
+
+    return numpy.array_equal(_dense(model1.setuptimes),
+                             _dense(model2.setuptimes))
+
+
+def _numbers(element, dtype):
+    """Reads a whitespace separated list from an element.
+
+    :element: the element containing the list
+    :dtype: the type of the items
+    :returns: a numpy array of the items
+
+    """
+    return numpy.array((element.text or "").split(), dtype=dtype)
+
+
+def _layout(arrays):
+    """Places arrays one after another at aligned offsets.
+
+    :arrays: the (name, array) pairs
+    :returns: the dtype, shape and offset of every array by its name and the
+    total size in bytes
+
+    """
+    layout = {}
+    offset = 0
+    for name, values in arrays:
+        offset = _aligned(offset)
+        layout[name] = {"dtype": values.dtype.str,
+                        "shape": list(values.shape),
+                        "offset": offset}
+        offset += values.nbytes
+    return layout, offset
+
+
+def _views(block, layout):
+    """Creates numpy arrays on a shared memory block.
+
+    :block: the shared memory block
+    :layout: the layout of the arrays (see _layout())
+    :returns: the arrays by their names
+
+    """
+    views = {}
+    for name, info in layout.items():
+        shape = tuple(info["shape"])
+        if numpy.prod(shape) == 0:
+            views[name] = numpy.empty(shape, dtype=info["dtype"])
+        else:
+            views[name] = numpy.ndarray(shape, dtype=info["dtype"],
+                                        buffer=block.buf,
+                                        offset=info["offset"])
+    return views
+
+
+def _attach(name):
+    """Attaches to an existing shared memory block without tracking it (the
+    creating process unlinks it).
+
+    :name: the name of the block
+    :returns: the shared memory block
+
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # python < 3.13 always registers the block. Processes started by
+        # multiprocessing share the resource tracker of their parent, which
+        # registers a block only once and forgets it, when it is unlinked.
+        return shared_memory.SharedMemory(name=name)
+
+
+def _aligned(offset):
+    """Rounds an offset up to the alignment of the compiled model files.
+
+    :offset: the offset in bytes
+    :returns: the aligned offset
+
+    """
+    return -(-offset // COMPILED_ALIGNMENT) * COMPILED_ALIGNMENT
+
+
+def file_hash(filename):
+    """Calculates the sha256 hash of a file's content.
+
+    :filename: the file to hash
+    :returns: the hex digest
+
+    """
+    digest = hashlib.sha256()
+    with open(filename, "rb") as hashed_file:
+        for block in iter(lambda: hashed_file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_info(filename, with_hash=True):
+    """Describes the source file of a compiled model.
+
+    :filename: the xml file of the model
+    :with_hash: whether to calculate the content hash
+    :returns: a dictionary with the size, the modification time (in ns) and
+    the content hash of the file
+
+    """
+    stat = os.stat(filename)
+    return {"size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": file_hash(filename) if with_hash else None}
+
+
+def _dense(setuptimes):
+    """Returns a setup matrix as a dense numpy array.
+
+    :setuptimes: a dense or sparse setup matrix
+    :returns: the dense array
+
+    """
+    if isinstance(setuptimes, SparseSetupMatrix):
+        return setuptimes.toarray()
+    return setuptimes
+
 
 def _xmleq(elem1, elem2):
     """Compares 2 objectified lxml elements.
@@ -0,0 +1,403 @@
+"""
+Pareto module.
+
+Holds the non-dominated sorting of metric vectors (as returned by
+JspEvaluator.evaluate_batch()), the hypervolume indicator and the class
+ParetoArchive, which keeps a bounded set of non-dominated solutions. All
+metrics are minimized.
+"""
+import bisect
+import numpy
+from jspeval import METRICS
+
+#: the maximum number of objectives, for which the hypervolume is calculated
+#: exactly (more objectives are estimated by Monte Carlo sampling)
+EXACT_DIMENSIONS = 4
+
+#: the maximum number of elements of the temporary arrays in the Monte Carlo
+#: estimation of the hypervolume (the samples are checked in blocks)
+BLOCK_ELEMENTS = 1 << 22
+
+
+def non_dominated_sort(metrics):
+    """
+    Sorts the metric vectors into non-dominated fronts (efficient
+    non-dominated sorting with binary search after Zhang et al.). The vectors
+    are processed in lexicographic order, so a vector can only be dominated by
+    vectors, that are already sorted into fronts. The front of every vector is
+    found by a binary search over the fronts, every front is compared with the
+    vector in one vectorized operation.
+
+    @param metrics: the metric vectors (N x metrics)
+    @type metrics: numpy.ndarray
+
+    @return: the front of every vector (0 is the non-dominated front)
+    @rtype: numpy.ndarray
+    """
+    points = _points(metrics)
+    ranks = numpy.empty(len(points), dtype=numpy.intp)
+    fronts = []
+    for index in numpy.lexsort(points.T[::-1]):
+        point = points[index]
+        # if a front dominates the vector, all fronts before it do as well
+        low, high = 0, len(fronts)
+        while low < high:
+            middle = (low + high) // 2
+            if fronts[middle].dominates(point):
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(fronts):
+            fronts.append(_Front(points.shape[1]))
+        fronts[low].append(point)
+        ranks[index] = low
+
+    return ranks
+
+
+def pareto_front(metrics):
+    """
+    Returns the indexes of the non-dominated metric vectors.
+
+    @param metrics: the metric vectors (N x metrics)
+    @type metrics: numpy.ndarray
+
+    @return: the (ascending) indexes of the vectors in the first front
+    @rtype: numpy.ndarray
+    """
+    points = _points(metrics)
+    front = _Front(points.shape[1])
+    indexes = []
+    for index in numpy.lexsort(points.T[::-1]):
+        if not front.dominates(points[index]):
+            front.append(points[index])
+            indexes.append(index)
+
+    return numpy.sort(numpy.array(indexes, dtype=numpy.intp))
+
+
+def _points(metrics):
+    """
+    Converts the metric vectors to a 2-D float array.
+    """
+    points = numpy.asarray(metrics, dtype=numpy.float64)
+    if points.ndim != 2:
+        raise ValueError("the metrics have to be a 2-D array")
+    return points
+
+
+class _Front(object):
+    """
+    The vectors of one front during the non-dominated sorting, stored in a
+    growing array.
+    """
+
+    def __init__(self, metrics_count):
+        self.points = numpy.empty((16, metrics_count))
+        self.size = 0
+
+    def append(self, point):
+        if self.size == len(self.points):
+            self.points = numpy.concatenate((self.points, self.points))
+        self.points[self.size] = point
+        self.size += 1
+
+    def dominates(self, point):
+        """
+        Checks, if any vector of the front dominates the point. The vectors
+        of the front precede the point lexicographically, so being better or
+        equal in all metrics and not equal is enough.
+        """
+        points = self.points[:self.size]
+        better = (points <= point).all(axis=1)
+        return bool((better & (points != point).any(axis=1)).any())
+
+
+def crowding_distance(metrics):
+    """
+    Calculates the crowding distance (after Deb et al.) of every vector in a
+    front. The extreme vectors of every metric get an infinite distance.
+
+    @param metrics: the metric vectors of one front (N x metrics)
+    @type metrics: numpy.ndarray
+
+    @return: the crowding distance of every vector
+    @rtype: numpy.ndarray
+    """
+    points = numpy.asarray(metrics, dtype=numpy.float64)
+    distances = numpy.zeros(len(points))
+    if len(points) < 3:
+        distances[:] = numpy.inf
+        return distances
+
+    order = numpy.argsort(points, axis=0, kind="stable")
+    for metric in range(points.shape[1]):
+        sorted_values = points[order[:, metric], metric]
+        value_range = sorted_values[-1] - sorted_values[0]
+        distances[order[[0, -1], metric]] = numpy.inf
+        if value_range > 0:
+            distances[order[1:-1, metric]] += \
+                (sorted_values[2:] - sorted_values[:-2]) / value_range
+
+    return distances
+
+
+def hypervolume(metrics, reference, objectives=None, samples=100000,
+                seed=None):
+    """
+    Calculates the hypervolume, that the metric vectors dominate up to the
+    reference point. For up to EXACT_DIMENSIONS objectives the hypervolume is
+    calculated exactly (sweeping in 2-D and 3-D, slicing along the last
+    objectives above), for more objectives it is estimated by Monte Carlo
+    sampling of the box between the best values and the reference point.
+    Vectors, that are not better than the reference point in all objectives,
+    do not contribute.
+
+    @param metrics: the metric vectors (N x metrics)
+    @type metrics: numpy.ndarray
+    @param reference: the reference point (a value for every objective)
+    @type reference: list
+    @param objectives: the objectives to use (column indexes of metrics or
+    names from jspeval.METRICS), all if None
+    @type objectives: list
+    @param samples: the number of samples for the Monte Carlo estimation
+    @type samples: number
+    @param seed: the seed for the Monte Carlo samples
+    @type seed: number
+
+    @return: the (estimated) hypervolume
+    @rtype: float
+    """
+    points = _points(metrics)
+    if objectives is not None:
+        columns = [METRICS.index(objective) if isinstance(objective, str)
+                   else objective for objective in objectives]
+        points = points[:, columns]
+    reference = numpy.asarray(reference, dtype=numpy.float64)
+    if reference.shape != points.shape[1:]:
+        raise ValueError("the reference point needs a value for every "
+                         "objective")
+
+    points = points[(points < reference).all(axis=1)]
+    if not len(points):
+        return 0.0
+    points = points[pareto_front(points)]
+    if points.shape[1] <= EXACT_DIMENSIONS:
+        return _exact_hypervolume(points, reference)
+    return _sampled_hypervolume(points, reference, samples, seed)
+
+
+def _exact_hypervolume(points, reference):
+    """
+    Calculates the hypervolume exactly. Above 3 objectives the volume is
+    sliced along the last objective: every slice holds the hypervolume of the
+    vectors up to it in the remaining objectives.
+    """
+    dimensions = points.shape[1]
+    if dimensions == 1:
+        return float(reference[0] - points[:, 0].min())
+    if dimensions == 2:
+        return _sweep_hypervolume(points, reference, None)
+
+    order = numpy.argsort(points[:, -1], kind="stable")
+    bounds = numpy.append(points[order, -1], reference[-1])
+    if dimensions == 3:
+        return _sweep_hypervolume(points[order], reference, bounds)
+
+    volume = 0.0
+    for index in range(len(order)):
+        height = bounds[index + 1] - bounds[index]
+        if height > 0:
+            volume += height * _exact_hypervolume(
+                points[order[:index + 1], :-1], reference[:-1])
+    return volume
+
+
+def _sweep_hypervolume(points, reference, bounds):
+    """
+    Sweeps over the vectors and keeps the dominated area of the first two
+    objectives in a staircase. In 2-D this is the hypervolume, in 3-D the
+    vectors are sorted by the last objective and the area of every slice is
+    multiplied with the height up to the next vector (bounds).
+    """
+    staircase = _Staircase(reference[0], reference[1])
+    volume = 0.0
+    for index, point in enumerate(points.tolist()):
+        staircase.add(point[0], point[1])
+        if bounds is not None:
+            volume += staircase.area * (bounds[index + 1] - bounds[index])
+    if bounds is None:
+        return staircase.area
+    return volume
+
+
+class _Staircase(object):
+    """
+    The non-dominated 2-D vectors (sorted by the first objective) and the area
+    they dominate up to the reference point.
+    """
+
+    def __init__(self, reference_x, reference_y):
+        self.reference_x = reference_x
+        self.reference_y = reference_y
+        self.xs = []
+        self.ys = []
+        self.area = 0.0
+
+    def add(self, x, y):
+        xs = self.xs
+        ys = self.ys
+        index = bisect.bisect_left(xs, x)
+        if index > 0 and ys[index - 1] <= y or \
+                index < len(xs) and xs[index] == x and ys[index] <= y:
+            return
+
+        # the vectors, that are dominated by the new one, follow it
+        end = index
+        while end < len(xs) and ys[end] >= y:
+            end += 1
+
+        # add the area between the new vector and the old staircase
+        height = ys[index - 1] if index > 0 else self.reference_y
+        left = x
+        for removed in range(index, end):
+            self.area += (xs[removed] - left) * (height - y)
+            left = xs[removed]
+            height = ys[removed]
+        right = xs[end] if end < len(xs) else self.reference_x
+        self.area += (right - left) * (height - y)
+
+        xs[index:end] = [x]
+        ys[index:end] = [y]
+
+
+def _sampled_hypervolume(points, reference, samples, seed):
+    """
+    Estimates the hypervolume by the fraction of uniform samples in the box
+    between the best values and the reference point, that are dominated by
+    a vector.
+    """
+    ideal = points.min(axis=0)
+    box = float(numpy.prod(reference - ideal))
+    random = numpy.random.RandomState(seed)
+    block = max(1, BLOCK_ELEMENTS // len(points))
+
+    dominated = 0
+    for start in range(0, samples, block):
+        count = min(block, samples - start)
+        sample = ideal + random.random_sample(
+            (count, points.shape[1])) * (reference - ideal)
+        # compare one objective at a time (samples x vectors)
+        mask = points[:, 0] <= sample[:, 0, numpy.newaxis]
+        for objective in range(1, points.shape[1]):
+            mask &= points[:, objective] <= sample[:, objective, numpy.newaxis]
+        dominated += mask.any(axis=1).sum()
+
+    return box * dominated / samples
+
+
+class ParetoArchive:
+    """
+    A bounded archive of non-dominated metric vectors and the solutions they
+    belong to. A vector is only inserted, if no archived vector is better or
+    equal in all metrics; the archived vectors it dominates are removed. If
+    the archive is full, the vector with the smallest crowding distance is
+    evicted.
+    """
+
+    def __init__(self, maxsize, metrics_count=6):
+        """
+        @param maxsize: the maximum number of archived vectors
+        @type maxsize: number
+        @param metrics_count: the length of the metric vectors
+        @type metrics_count: number
+        """
+        if maxsize < 1:
+            raise ValueError("the archive has to hold at least one vector")
+        self.maxsize = maxsize
+        self._points = numpy.empty((maxsize + 1, metrics_count))
+        self._solutions = []
+
+    def __len__(self):
+        return len(self._solutions)
+
+    @property
+    def metrics(self):
+        """
+        The archived metric vectors (a copy, in the order of solutions).
+        """
+        return self._points[:len(self)].copy()
+
+    @property
+    def solutions(self):
+        """
+        The solutions of the archived metric vectors.
+        """
+        return list(self._solutions)
+
+    def add(self, metrics, solution=None):
+        """
+        Inserts a metric vector into the archive.
+
+        @param metrics: the metric vector
+        @type metrics: list
+        @param solution: the solution, that belongs to the metric vector
+        @type solution: object
+
+        @return: True, if the vector was inserted (it may still be evicted
+        right away, if the archive is full)
+        @rtype: bool
+        """
+        point = numpy.asarray(metrics, dtype=numpy.float64)
+        if point.shape != self._points.shape[1:]:
+            raise ValueError("the metric vector has the wrong length")
+        size = len(self)
+        archived = self._points[:size]
+
+        # reject the vector, if an archived vector is at least as good
+        if (archived <= point).all(axis=1).any():
+            return False
+
+        # remove the archived vectors, that are dominated by the new one
+        keep = ~(point <= archived).all(axis=1)
+        if not keep.all():
+            size = int(keep.sum())
+            self._points[:size] = archived[keep]
+            self._solutions = [archived_solution for archived_solution, kept
+                               in zip(self._solutions, keep) if kept]
+
+        self._points[size] = point
+        self._solutions.append(solution)
+        if size == self.maxsize:
+            self._evict()
+        return True
+
+    def add_batch(self, metrics, solutions=None):
+        """
+        Inserts the non-dominated vectors of a population into the archive.
+
+        @param metrics: the metric vectors (N x metrics)
+        @type metrics: numpy.ndarray
+        @param solutions: the solutions of the vectors (None for no
+        solutions)
+        @type solutions: list
+
+        @return: the number of inserted vectors
+        @rtype: number
+        """
+        points = numpy.asarray(metrics, dtype=numpy.float64)
+        inserted = 0
+        for index in pareto_front(points):
+            solution = None if solutions is None else solutions[index]
+            inserted += self.add(points[index], solution)
+        return inserted
+
+    def _evict(self):
+        """
+        Removes the vector with the smallest crowding distance.
+        """
+        size = len(self)
+        distances = crowding_distance(self._points[:size])
+        index = int(numpy.argmin(distances))
+        self._points[index:size - 1] = self._points[index + 1:size]
+        del self._solutions[index]
@@ -0,0 +1,209 @@
+"""
+Registry module.
+
+Holds the class ModelRegistry, which loads many model files in parallel on
+a process pool and keeps the compiled models in memory, keyed by their name
+and the hash of their content.
+"""
+import os
+import glob
+import multiprocessing
+from jspmodel import JspModel, file_hash
+
+#: the suffixes of the model files, that are loaded from a directory
+MODEL_SUFFIXES = (".xml", ".xml.gz")
+
+#: the suffixes of the files in the Peres et al. format (see
+#: JspModel.from_peres())
+PERES_SUFFIXES = (".txt", ".txt.gz")
+
+
+def model_name(filename):
+    """
+    @param filename: the model file
+    @type filename: str
+
+    @return: the name of a model (the filename without directory and
+    suffix)
+    @rtype: str
+    """
+    name = os.path.basename(filename)
+    for suffix in MODEL_SUFFIXES + PERES_SUFFIXES:
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return os.path.splitext(name)[0]
+
+
+def find_models(pattern):
+    """
+    Lists the model files of a directory (see MODEL_SUFFIXES) or the files
+    matching a glob pattern.
+
+    @param pattern: a directory or a glob pattern
+    @type pattern: str
+
+    @return: the sorted filenames
+    @rtype: list
+    """
+    if os.path.isdir(pattern):
+        return sorted(os.path.join(pattern, name)
+                      for name in os.listdir(pattern)
+                      if name.endswith(MODEL_SUFFIXES))
+    return sorted(name for name in glob.glob(pattern)
+                  if os.path.isfile(name))
+
+
+def _load_model(args):
+    """
+    Hashes and loads a model file in a worker process. Models, whose hash is
+    already known, are not loaded again.
+
+    @param args: the filename, the known hashes and the options of the
+    JspModel
+    @type args: tuple
+
+    @return: the filename, the hash and the compiled model (None if the hash
+    was known)
+    @rtype: tuple
+    """
+    filename, known, options = args
+    sha256 = file_hash(filename)
+    if sha256 in known:
+        return filename, sha256, None
+    if filename.endswith(PERES_SUFFIXES):
+        model = JspModel.from_peres(
+            filename, **{key: value for key, value in options.items()
+                         if key in ("setup_storage", "setup_dtype")})
+    else:
+        model = JspModel(filename, keep_tree=False, **options)
+    return filename, sha256, model
+
+
+class ModelRegistry(object):
+    """ Loads model files in parallel and keeps the compiled models (without
+    xml tree) in memory. Models are shared by the hash of their content, so
+    a file, that was already loaded (or a copy of it), is served from memory.
+    Files are hashed again, when their size or modification time changed.
+    """
+
+    def __init__(self, processes=None, **options):
+        """
+        @param processes: the number of worker processes (None for the
+        number of cpus)
+        @type processes: int
+        @param options: the options of every JspModel (e.g. setup_storage,
+        setup_dtype or streaming, which is on by default)
+        """
+        self.processes = processes
+        self.options = dict({"streaming": True}, **options)
+        # the models by the hash of their content
+        self._models = {}
+        # the (size, modification time, hash) of every loaded file
+        self._files = {}
+
+    def load(self, pattern):
+        """
+        Loads all model files of a directory or matching a glob pattern.
+        Files, that are not in memory, are loaded on a process pool.
+
+        @param pattern: a directory, a glob pattern or a single filename
+        @type pattern: str
+
+        @return: the models by their names (see model_name())
+        @rtype: dict
+
+        @raise ValueError: if two files have the same name (e.g. tai01.xml
+        and tai01.xml.gz)
+        """
+        filenames = find_models(pattern)
+        names = {}
+        for filename in filenames:
+            other = names.setdefault(model_name(filename), filename)
+            if other != filename:
+                raise ValueError("duplicate model name {!r}: {} and {}".format(
+                    model_name(filename), other, filename))
+        hashes = {}
+        missing = []
+        for filename in filenames:
+            path = os.path.abspath(filename)
+            stat = os.stat(path)
+            known = self._files.get(path)
+            if known is not None and known[:2] == \
+                    (stat.st_size, stat.st_mtime_ns) and \
+                    known[2] in self._models:
+                hashes[filename] = known[2]
+            else:
+                missing.append((stat.st_size, stat.st_mtime_ns, path,
+                                filename))
+
+        # the largest files first, so the load is balanced between the
+        # workers
+        missing.sort(reverse=True)
+        known = frozenset(self._models)
+        jobs = [(path, known, self.options) for _, _, path, _ in missing]
+        if len(jobs) > 1 and self.processes != 1:
+            with multiprocessing.Pool(
+                    min(self.processes or os.cpu_count(), len(jobs))) as pool:
+                results = pool.map(_load_model, jobs, chunksize=1)
+        else:
+            results = [_load_model(job) for job in jobs]
+
+        for (size, mtime, path, filename), (_, sha256, model) in zip(
+                missing, results):
+            if model is not None:
+                # identical files in one call share the first model
+                self._models.setdefault(sha256, model)
+            self._files[path] = (size, mtime, sha256)
+            hashes[filename] = sha256
+
+        return {name: self._models[hashes[filename]]
+                for name, filename in names.items()}
+
+    def get(self, filename):
+        """
+        @param filename: a model file
+        @type filename: str
+
+        @return: the model of the file (loaded in this process, if it is not
+        in memory)
+        @rtype: L{JspModel}
+        """
+        if not os.path.isfile(filename):
+            raise IOError("no model file: {}".format(filename))
+        return self.load(glob.escape(filename))[model_name(filename)]
+
+    def content_hash(self, filename):
+        """
+        @param filename: a loaded model file
+        @type filename: str
+
+        @return: the sha256 hash of the file's content, when it was loaded
+        (None, if it was not loaded)
+        @rtype: str
+        """
+        known = self._files.get(os.path.abspath(filename))
+        return None if known is None else known[2]
+
+    def __getitem__(self, sha256):
+        """
+        @return: the model with the given content hash
+        @rtype: L{JspModel}
+        """
+        return self._models[sha256]
+
+    def __contains__(self, sha256):
+        return sha256 in self._models
+
+    def __len__(self):
+        """
+        @return: the number of different models in memory
+        @rtype: number
+        """
+        return len(self._models)
+
+    def clear(self):
+        """
+        Releases all models.
+        """
+        self._models.clear()
+        self._files.clear()
@@ -1,7 +1,7 @@
 """ Represents a solution that is coded permutation based. Provides means to
 access the priority and machine assignment for every operation.
 """
-import math
+import numpy
 
 
 class JspSolution(object):
@@ -56,9 +56,7 @@ class JspSolution(object):
         @rtype: number
         """
         if self.machine_assignment is None:
-            self.machine_assignment =\
-                [self._determine_machine_index(idx)
-                 for idx, _ in enumerate(self._values)]
+            self._decode()
 
         return self.machine_assignment[index]
 
@@ -74,52 +72,18 @@ class JspSolution(object):
         @rtype: number
         """
         if self.priorities is None:
-            self.priorities =\
-                [self._determine_priority(idx)
-                 for idx, _ in enumerate(self._values)]
+            self._decode()
 
         return self.priorities[index]
 
-    def _determine_machine_index(self, index):
+    def _decode(self):
         """
-        Function that determines on which machine an operation is processed.
-        Only the for this operation allowed machines are considered.
-
-        @param index: the index of the operation in the solution
-        @type index: number
-
-        @return: the machines index (int)
-        @rtype: number
-        """
-
-        index = int(index)
-        if self.get_values()[index] < 0.0 or self.get_values()[index] > 1.0:
-            raise ValueError("the allel shall be between 0.0 and 1.0")
-
-        operation, _, rel_index = self._get_operation_and_rel_index(index)
-
-        return self.model.allowed_machines[operation][rel_index]
-
-    def _determine_priority(self, index):
-        """
-        Function that determines the remainder, which is cleaned from the
-        machine mapping, from the allel. This remainder is used for priority
-        calculation.
-
-        @param index: the index of the operation in the solution
-        @type index: number
-
-        @return: the priority
-        @rtype: number
+        Precalculates the machine assignment and the priorities for all
+        operations at once (see decode()).
         """
-
-        index = int(index)
-        if self.get_values()[index] < 0.0 or self.get_values()[index] > 1.0:
-            raise ValueError("the allel shall be between 0.0 and 1.0")
-
-        _, num_machines, rel_index = self._get_operation_and_rel_index(index)
-
-        return self.get_values()[index] * num_machines - rel_index
+        machines, priorities = decode(self.model, self.get_values())
+        self.machine_assignment = machines.tolist()
+        self.priorities = priorities.tolist()
 
     def __getitem__(self, index):
         return self.get_values()[index]
@@ -133,21 +97,40 @@ class JspSolution(object):
         """
         return len(self.get_values())
 
-    def _get_operation_and_rel_index(self, index):
-        """ Gets the job-operation tuple from a global index, and the relative
-        index of the assigned machine.
 
-        @param index: the local index of an operation
-
-        @return: 3 values:
-            the global index of the specified operation as tuple,
-            the number of allowed machines for the operation and
-            the local index of the assigned machine
-        @rtype: (number, number), number, number
-        """
-        operation = self.model.translate_global_index(index)
-        num_machines = len(self.model.allowed_machines[operation])
-        # this is the index of the machine relative to the allowed machines
-        rel_index = int(math.floor(num_machines * self.get_values()[index]))
-
-        return operation, num_machines, rel_index
+def decode(model, values):
+    """
+    Determines the assigned machine and the priority for every operation of
+    one solution (value array) or a whole population (one solution per row)
+    with a few array operations.
+
+    The allel of an operation is scaled by the number of its allowed machines.
+    The integer part selects the machine (relative to the allowed machines),
+    the remainder is the priority. An allel of exactly 1.0 selects the last
+    allowed machine.
+
+    @param model: the model the values belong to
+    @type model: L{jspmodel.JspModel}
+    @param values: the solution values (solution_length or
+    N x solution_length)
+    @type values: list or numpy.ndarray
+
+    @return: 2 arrays of the same shape as values: the machine indexes and
+    the priorities
+    @rtype: numpy.ndarray, numpy.ndarray
+    """
+    values = numpy.asarray(values, dtype=numpy.float64)
+    if values.shape[-1:] != (model.solution_length(),):
+        raise IndexError("the solution does not fit the model (",
+                         model.solution_length(),
+                         " operations versus shape ", values.shape, ")")
+    if not numpy.logical_and(values >= 0.0, values <= 1.0).all():
+        raise ValueError("the allel shall be between 0.0 and 1.0")
+
+    num_machines = model.allowed_counts
+    scaled = values * num_machines
+    # this is the index of the machine relative to the allowed machines
+    rel_index = numpy.minimum(scaled.astype(numpy.intp), num_machines - 1)
+    machines = model.allowed_indices[model.allowed_offsets[:-1] + rel_index]
+
+    return machines, scaled - rel_index
@@ -0,0 +1,59 @@
+""" Tests for the benchmark script
+"""
+import pytest
+import jspbenchmark
+
+
+def test_configs_sorted_by_operations():
+    configs = jspbenchmark.get_configs(["yaml/speedtest"], 500)
+
+    assert [config[0] for config in configs] == [
+        "100operations", "200operations", "300operations", "400operations",
+        "500operations"]
+    assert [config[2] for config in configs] == [100, 200, 300, 400, 500]
+
+
+def test_run_benchmark(tmpdir):
+    configs = jspbenchmark.get_configs(["yaml/example.yaml"])
+    results = jspbenchmark.run_benchmark(configs, str(tmpdir), 1, 3, 1)
+    measures = results["models"]["example"]
+
+    assert results["seed"] == 1
+    assert measures["operations"] > 0
+    assert measures["size_gz"] < measures["size"]
+    assert measures["load_time"] > 0 and measures["load_time_gz"] > 0
+    assert measures["evaluate"] > 0 and measures["evaluate_batch"] > 0
+    # the models are generated reproducibly and only once
+    assert len(tmpdir.join("seed1").listdir()) == 2
+    assert jspbenchmark.generate_models(configs[0], str(tmpdir), 1) == [
+        str(tmpdir.join("seed1", "example.xml")),
+        str(tmpdir.join("seed1", "example.xml.gz"))]
+
+
+def test_measure_load_peak_memory(tmpdir):
+    configs = jspbenchmark.get_configs(["yaml/speedtest"], 100)
+    filename = jspbenchmark.generate_models(configs[0], str(tmpdir), 1)[0]
+    peak = jspbenchmark.measure_load(filename)[1]
+    # the child does not report the peak of a large parent
+    ballast = b"\x01" * (400 << 20)
+    again = jspbenchmark.measure_load(filename)[1]
+    del ballast
+
+    assert peak > 0 and again > 0
+    assert 0.5 < again / peak < 2.0
+
+
+@pytest.mark.parametrize("measure, value, regressed", [
+    ("load_time", 1.05, False),
+    ("load_time", 1.2, True),
+    ("peak_memory", 0.5, False),
+    ("evaluate", 0.95, False),
+    ("evaluate", 0.8, True),
+    ("evaluate_batch", 2.0, False),
+    ("size", 10.0, False),
+])
+def test_compare(measure, value, regressed):
+    baseline = {"models": {"model": {measure: 1.0}}}
+    results = {"models": {"model": {measure: value}, "new": {measure: 5.0}}}
+
+    assert bool(jspbenchmark.compare(results, baseline, 0.1)) == regressed
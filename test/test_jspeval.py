@@ -3,8 +3,10 @@
 from test.conftest import isclose
 import pytest
 import numpy as np
-from jspsolution import JspSolution
-from jspeval import JspEvaluator
+from jspsolution import JspSolution, decode
+import jspeval
+from jspeval import JspEvaluator, IncrementalJspEvaluator, Aborted
+from jspeval import ParallelJspEvaluator
 from jspmodel import JspModel
 
 
@@ -21,10 +23,12 @@ def test_machine_assignment_everything_assigned(evaluator, rand_solution):
 
 
 @pytest.mark.parametrize("array", [
-    pytest.mark.xfail(raises=IndexError)([0, 0, 0]),
-    pytest.mark.xfail(raises=IndexError)([0, 0, 0, 0, 0]),
-    pytest.mark.xfail(raises=IndexError)(np.array([0, 0, 0])),
-    pytest.mark.xfail(raises=IndexError)(np.array([0, 0, 0, 0, 0]))
+    pytest.param([0, 0, 0], marks=pytest.mark.xfail(raises=IndexError)),
+    pytest.param([0, 0, 0, 0, 0], marks=pytest.mark.xfail(raises=IndexError)),
+    pytest.param(np.array([0, 0, 0]),
+                 marks=pytest.mark.xfail(raises=IndexError)),
+    pytest.param(np.array([0, 0, 0, 0, 0]),
+                 marks=pytest.mark.xfail(raises=IndexError))
 ])
 def test_machine_assignment_dont_accept_unfitting_solutions(
         evaluator,
@@ -560,3 +564,491 @@ def test_calculate_partial_setuptime():
 
     assert schedule[(1, 1)][0] == 2.0
     assert np_schedule[(1, 1)][0] == 2.0
+
+
+def test_evaluate_without_tree(model_complex):
+    dropped = JspModel("test/complexmodel.xml", keep_tree=False)
+    values = [0.93, 0.71, 0.33, 0.17, 0.07, 0.49, 0.64, 0.48,
+              0.33, 0.72, 0.52, 0.47]
+    results = []
+    for mdl in (model_complex, dropped):
+        evaluator = JspEvaluator(mdl)
+        assignment = evaluator.build_machine_assignment(
+            JspSolution(mdl, values))
+        schedule = evaluator.execute_schedule(assignment)
+        results.append(evaluator.get_metrics(assignment, schedule))
+
+    assert results[0] == results[1]
+
+
+def test_execute_schedule_equal_priorities(model_complex):
+    # equal priorities are dispatched in the order the operations became
+    # available
+    evaluator = JspEvaluator(model_complex)
+    assignment = evaluator.build_machine_assignment(
+        JspSolution(model_complex, [0.0] * 12))
+    schedule = evaluator.execute_schedule(assignment)
+
+    assert list(schedule.keys()) == [
+        (0, 0), (1, 0), (2, 0), (3, 0), (4, 0), (0, 1),
+        (1, 1), (2, 1), (1, 2), (2, 2), (1, 3), (1, 4)]
+    assert schedule[(1, 2)] == (1.5, 91.5)
+    assert schedule[(1, 4)] == (0.0, 146.5)
+
+
+def test_evaluate_batch(model_complex, model_10operations):
+    for mdl in (model_complex, model_10operations):
+        evaluator = JspEvaluator(mdl)
+        matrix = np.random.rand(20, mdl.solution_length())
+        metrics = evaluator.evaluate_batch(matrix)
+
+        assert metrics.shape == (20, evaluator.metrics_count())
+        for values, row in zip(matrix, metrics):
+            assignment = evaluator.build_machine_assignment(
+                JspSolution(mdl, values))
+            schedule = evaluator.execute_schedule(assignment)
+            assert np.allclose(
+                row, evaluator.get_metrics(assignment, schedule))
+
+
+def test_evaluate_batch_complex_solution(model_complex):
+    evaluator = JspEvaluator(model_complex)
+    metrics = evaluator.evaluate_batch(
+        [[0.93, 0.71, 0.33, 0.17, 0.07, 0.49, 0.64, 0.48,
+          0.33, 0.72, 0.52, 0.47]])
+
+    assert metrics[0, 0] == 126.5
+    assert metrics[0, 1] == 95.25
+    assert isclose(metrics[0, 2], 1.3921553884711779)
+    assert metrics[0, 3] == 7.0
+    assert isclose(metrics[0, 4], 0.15714880181131291)
+    assert metrics[0, 5] == 10
+
+
+@pytest.mark.parametrize("matrix", [
+    np.zeros((3, 3)),
+    np.zeros((3, 5)),
+    np.zeros(4),
+    np.array([[0.1, 0.2, 1.3, 0.4]]),
+    np.array([[0.1, -0.2, 0.3, 0.4]]),
+])
+def test_evaluate_batch_dont_accept_unfitting_solutions(evaluator, matrix):
+    with pytest.raises(ValueError):
+        evaluator.evaluate_batch(matrix)
+
+
+@pytest.mark.parametrize("values, expected", [
+    ([0.93, 0.71, 0.33, 0.17, 0.07, 0.49, 0.64, 0.48, 0.33, 0.72, 0.52, 0.47],
+     [126.5, 95.25, 1.3921553884711779, 7.0, 0.15714880181131291, 10]),
+    ([0.0] * 12,
+     [146.5, 0.0, 1.0504761904761906, 1.5, 0.22439461956039905, 10]),
+])
+def test_evaluate_complex_solution(model_complex, values, expected):
+    evaluator = JspEvaluator(model_complex)
+
+    for solution in (values, np.array(values),
+                     JspSolution(model_complex, values)):
+        assert np.allclose(evaluator.evaluate(solution), expected)
+
+
+def test_evaluate_equals_pipeline(model_10operations):
+    evaluator = JspEvaluator(model_10operations)
+    for _ in range(20):
+        solution = model_10operations.get_random_solution()
+        assignment = evaluator.build_machine_assignment(solution)
+        schedule = evaluator.execute_schedule(assignment)
+
+        assert np.allclose(evaluator.evaluate(solution),
+                           evaluator.get_metrics(assignment, schedule))
+
+
+@pytest.mark.xfail(raises=ValueError)
+def test_evaluate_dont_accept_unfitting_solutions(evaluator):
+    evaluator.evaluate([0.1, 0.2, 0.3])
+
+
+@pytest.mark.parametrize("storage", ["dense", "sparse"])
+def test_evaluate_setup_storage(storage):
+    model = JspModel("test/complexmodel.xml", setup_storage=storage)
+    evaluator = JspEvaluator(model)
+    metrics = evaluator.evaluate(
+        [0.93, 0.71, 0.33, 0.17, 0.07, 0.49, 0.64, 0.48,
+         0.33, 0.72, 0.52, 0.47])
+
+    assert metrics[0] == 126.5
+    assert metrics[3] == 7.0
+
+
+def test_evaluate_mapped_setuptimes(model_complex, tmpdir):
+    mapped = JspModel("test/complexmodel.xml",
+                      setup_mmap=str(tmpdir.join("setuptimes.npy")))
+    matrix = np.random.rand(10, model_complex.solution_length())
+
+    assert np.array_equal(JspEvaluator(mapped).evaluate_batch(matrix),
+                          JspEvaluator(model_complex).evaluate_batch(matrix))
+
+
+@pytest.mark.parametrize("interval", [1, 2, 5, None])
+def test_incremental_reevaluate(model_complex, interval):
+    evaluator = JspEvaluator(model_complex)
+    incremental = IncrementalJspEvaluator(model_complex, interval)
+    base = np.random.rand(model_complex.solution_length())
+
+    assert incremental.set_base(base) == evaluator.evaluate(base)
+    for _ in range(50):
+        mutated = base.copy()
+        mutated[np.random.randint(len(base))] = np.random.rand()
+        metrics = incremental.reevaluate(mutated)
+
+        assert metrics == evaluator.evaluate(mutated)
+        base = mutated
+
+
+def test_incremental_reevaluate_late_change(model_complex):
+    incremental = IncrementalJspEvaluator(model_complex, 1)
+    base = [0.93, 0.71, 0.33, 0.17, 0.07, 0.49, 0.64, 0.48,
+            0.33, 0.72, 0.52, 0.47]
+    incremental.set_base(base)
+
+    # the last operation of job 1 becomes available late
+    mutated = list(base)
+    mutated[6] = 0.61
+    metrics = incremental.reevaluate(mutated, update=False)
+
+    assert incremental.resumed_step > 0
+    assert metrics == JspEvaluator(model_complex).evaluate(mutated)
+    # the base is kept and unchanged solutions are not scheduled again
+    assert incremental.reevaluate(base) == \
+        JspEvaluator(model_complex).evaluate(base)
+    assert incremental.resumed_step == len(base)
+
+
+@pytest.mark.xfail(raises=ValueError)
+def test_incremental_reevaluate_without_base(model_complex):
+    IncrementalJspEvaluator(model_complex).reevaluate([0.5] * 12)
+
+
+def test_cache_hits_on_equal_priority_order(model_complex):
+    evaluator = JspEvaluator(model_complex, cache_size=10)
+    values = np.array([0.93, 0.71, 0.33, 0.17, 0.07, 0.49, 0.64, 0.48,
+                       0.33, 0.72, 0.52, 0.47])
+    # same machines and the same order of priorities (0.86 -> 0.88)
+    shifted = values.copy()
+    shifted[0] = 0.94
+
+    first = evaluator.evaluate(values)
+    second = evaluator.evaluate(shifted)
+
+    assert first == second == [126.5, 95.25, first[2], 7.0, first[4], 10]
+    assert evaluator.cache_info() == \
+        {"hits": 1, "misses": 1, "size": 1, "maxsize": 10}
+
+
+def test_cache_lru_eviction(model_complex):
+    evaluator = JspEvaluator(model_complex, cache_size=2)
+    solutions = np.random.rand(3, model_complex.solution_length())
+    for values in solutions:
+        evaluator.evaluate(values)
+    evaluator.evaluate(solutions[0])
+
+    assert evaluator.cache_info()["misses"] == 4
+    assert evaluator.cache_info()["size"] == 2
+    evaluator.cache_clear()
+    assert evaluator.cache_info() == \
+        {"hits": 0, "misses": 0, "size": 0, "maxsize": 2}
+
+
+def test_cache_evaluate_batch(model_complex):
+    uncached = JspEvaluator(model_complex)
+    evaluator = JspEvaluator(model_complex, cache_size=100)
+    parents = np.random.rand(5, model_complex.solution_length())
+    population = parents[np.random.randint(5, size=40)]
+
+    assert np.array_equal(evaluator.evaluate_batch(population),
+                          uncached.evaluate_batch(population))
+    assert evaluator.cache_info()["misses"] <= 5
+    assert evaluator.cache_info()["hits"] >= 35
+    assert JspEvaluator(model_complex).cache_info() is None
+
+
+def test_cache_evaluate_batch_all_cached(model_complex):
+    evaluator = JspEvaluator(model_complex, cache_size=10)
+    population = np.random.rand(4, model_complex.solution_length())
+    expected = evaluator.evaluate_batch(population)
+
+    # every row is a cache hit, nothing is scheduled
+    assert np.array_equal(evaluator.evaluate_batch(population), expected)
+    assert evaluator.cache_info()["hits"] == 4
+
+
+@pytest.mark.parametrize("cache_size", [0, 10])
+def test_evaluate_batch_empty(model_complex, cache_size):
+    evaluator = JspEvaluator(model_complex, cache_size=cache_size)
+    matrix = np.empty((0, model_complex.solution_length()))
+    assert evaluator.evaluate_batch(matrix).shape == (0, 6)
+    assert evaluator.evaluate_batch(matrix, metrics=["wip"]).shape == (0, 1)
+
+
+def test_calc_loadbalance_empty(model_complex):
+    evaluator = JspEvaluator(model_complex)
+    machines = np.empty((0, model_complex.solution_length()), dtype=np.intp)
+    assert evaluator._calc_loadbalance(machines, np.empty(0)).shape == (0,)
+
+
+def test_metric_selection(model_complex):
+    values = [0.93, 0.71, 0.33, 0.17, 0.07, 0.49, 0.64, 0.48,
+              0.33, 0.72, 0.52, 0.47]
+    evaluator = JspEvaluator(model_complex)
+    selective = JspEvaluator(model_complex,
+                             metrics=["tardiness", "makespan"])
+    assignment = evaluator.build_machine_assignment(
+        JspSolution(model_complex, values))
+    schedule = evaluator.execute_schedule(assignment)
+
+    assert selective.metrics_count() == 2
+    assert selective.evaluate(values) == [95.25, 126.5]
+    assert selective.evaluate_batch([values]).tolist() == [[95.25, 126.5]]
+    assert selective.get_metrics(assignment, schedule) == [95.25, 126.5]
+    # selection at call time
+    assert evaluator.evaluate(values, metrics=[5, "setuptime"]) == [10, 7.0]
+    assert evaluator.metrics_count([4]) == 1
+    assert isclose(evaluator.evaluate(values, metrics=["loadbalance"])[0],
+                   0.15714880181131291)
+
+
+@pytest.mark.parametrize("metrics", [
+    [],
+    ["makespan", "lateness"],
+    [6],
+    [-1],
+    [1.5],
+    [True],
+])
+def test_metric_selection_invalid(model_complex, metrics):
+    with pytest.raises(ValueError):
+        JspEvaluator(model_complex, metrics=metrics)
+
+
+def test_cache_metric_selection(model_complex):
+    evaluator = JspEvaluator(model_complex, cache_size=10)
+    values = np.random.rand(model_complex.solution_length())
+
+    assert len(evaluator.evaluate(values, metrics=["makespan"])) == 1
+    assert len(evaluator.evaluate(values)) == 6
+    assert evaluator.cache_info()["misses"] == 2
+
+
+@pytest.mark.parametrize("starts, ends, expected", [
+    # job 0 ends when jobs 1 and 2 start, job 3 ends when job 4 starts
+    ([0, 10, 10, 5, 20], [10, 20, 30, 20, 30], 10),
+    # all jobs touch in a chain
+    ([0, 10, 20, 30, 40], [10, 20, 30, 40, 50], 5),
+    ([0, 0, 0, 0, 0], [10, 10, 10, 10, 10], 14),
+])
+def test_calc_wip_touching_jobs(model_complex, starts, ends, expected):
+    evaluator = JspEvaluator(model_complex)
+
+    assert evaluator._calc_wip(np.array([starts], dtype=float),
+                               np.array([ends], dtype=float)) == [expected]
+
+
+def test_calc_metrics_population(model_complex):
+    evaluator = JspEvaluator(model_complex)
+    matrix = np.random.rand(10, model_complex.solution_length())
+    machines, _ = decode(model_complex, matrix)
+    states = [evaluator._schedule_decoded(machines[row], values.tolist())
+              for row, values in enumerate(decode(model_complex, matrix)[1])]
+
+    metrics = evaluator._calc_metrics(
+        machines, [state.job_starts for state in states],
+        [state.job_ready for state in states],
+        np.array([state.setuptime for state in states]))
+
+    assert metrics.shape == (10, 6)
+    for row, state in enumerate(states):
+        assert metrics[row].tolist() == evaluator._state_metrics(
+            machines[row], state)
+
+
+@pytest.mark.parametrize("bounds, expected", [
+    ({"makespan": 126.5, "tardiness": 95.25, "setuptime": 7.0}, None),
+    ({"makespan": 126.4}, "makespan"),
+    ({1: 95.0}, "tardiness"),
+    ({"setuptime": 6.5, "makespan": 1000}, "setuptime"),
+])
+def test_evaluate_bounded(model_complex, bounds, expected):
+    evaluator = JspEvaluator(model_complex)
+    values = [0.93, 0.71, 0.33, 0.17, 0.07, 0.49, 0.64, 0.48,
+              0.33, 0.72, 0.52, 0.47]
+    result = evaluator.evaluate(values, bounds=bounds)
+
+    if expected is None:
+        assert result == evaluator.evaluate(values)
+    else:
+        assert isinstance(result, Aborted)
+        assert result.metric == expected
+        assert 0 < result.step <= len(values)
+
+
+def test_evaluate_bounded_early_abort(model_complex):
+    evaluator = JspEvaluator(model_complex)
+    values = [0.93, 0.71, 0.33, 0.17, 0.07, 0.49, 0.64, 0.48,
+              0.33, 0.72, 0.52, 0.47]
+
+    # the processing times alone exceed the bound
+    assert evaluator.evaluate(values, bounds={"makespan": 50}) == \
+        Aborted("makespan", 1)
+    assert evaluator.evaluate(values, bounds={"setuptime": 1}).step < 12
+
+
+@pytest.mark.parametrize("bound_interval", [1, 3, 5, 12])
+def test_evaluate_bound_interval(model_complex, bound_interval):
+    values = [0.93, 0.71, 0.33, 0.17, 0.07, 0.49, 0.64, 0.48,
+              0.33, 0.72, 0.52, 0.47]
+    bounds = {"setuptime": 1}
+    first = JspEvaluator(model_complex, bound_interval=1).evaluate(
+        values, bounds=bounds).step
+    evaluator = JspEvaluator(model_complex, bound_interval=bound_interval)
+    step = evaluator.evaluate(values, bounds=bounds).step
+
+    # the bounds are only checked every bound_interval steps
+    assert step % bound_interval == 0 or step == len(values)
+    assert first <= step < first + bound_interval
+
+
+@pytest.mark.parametrize("bounds", [
+    {"wip": 10},
+    {"lateness": 10},
+    {-1: 10},
+    {True: 10},
+])
+def test_evaluate_bounded_invalid(model_complex, bounds):
+    with pytest.raises(ValueError):
+        JspEvaluator(model_complex).evaluate([0.5] * 12, bounds=bounds)
+
+
+def test_incremental_reevaluate_bounded(model_complex):
+    incremental = IncrementalJspEvaluator(model_complex, 2)
+    base = [0.93, 0.71, 0.33, 0.17, 0.07, 0.49, 0.64, 0.48,
+            0.33, 0.72, 0.52, 0.47]
+    base_metrics = incremental.set_base(base)
+    mutated = list(base)
+    mutated[9] = 0.1
+    metrics = JspEvaluator(model_complex).evaluate(mutated)
+
+    assert isinstance(incremental.reevaluate(
+        mutated, bounds={"makespan": metrics[0] - 1}), Aborted)
+    # the aborted solution does not become the base
+    assert incremental.reevaluate(base, bounds={"makespan": 1000}) == \
+        base_metrics
+    assert incremental.reevaluate(
+        mutated, bounds={"makespan": metrics[0]}) == metrics
+
+
+def test_profile_stats(model_complex):
+    evaluator = JspEvaluator(model_complex, profile=True)
+    values = np.random.rand(4, model_complex.solution_length())
+    evaluator.evaluate_batch(values)
+    batch = evaluator.profile_stats()
+    assignment = evaluator.build_machine_assignment(
+        JspSolution(model_complex, values[0]))
+    evaluator.execute_schedule(assignment)
+    stats = evaluator.profile_stats()
+
+    assert batch["calls"]["schedule"] == 4
+    assert batch["calls"]["decode"] == batch["calls"]["wip"] == 1
+    assert batch["dispatch_steps"] == 48
+    assert sum(batch["setup_lookups"].values()) == 48
+    assert stats["calls"]["build_machine_assignment"] == 1
+    assert stats["calls"]["execute_schedule"] == 1
+    assert stats["dispatch_steps"] == 60
+    assert all(seconds >= 0 for seconds in stats["time"].values())
+    assert JspEvaluator(model_complex).profile_stats() is None
+
+
+def test_profiling_context(model_complex):
+    evaluator = JspEvaluator(model_complex)
+    values = [0.93, 0.71, 0.33, 0.17, 0.07, 0.49, 0.64, 0.48,
+              0.33, 0.72, 0.52, 0.47]
+    with evaluator.profiling() as fused:
+        evaluator.evaluate(values, metrics=["makespan"])
+    with evaluator.profiling() as pipeline:
+        evaluator.execute_schedule(evaluator.build_machine_assignment(
+            JspSolution(model_complex, values)))
+
+    assert sorted(fused["calls"]) == ["decode", "makespan", "schedule"]
+    assert fused["dispatch_steps"] == pipeline["dispatch_steps"] == 12
+    # both paths look up the same setuptimes
+    assert fused["setup_lookups"] == pipeline["setup_lookups"]
+    assert fused["setup_lookups"]["nonzero"] > 0
+    assert evaluator.profile_stats() is None
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 7])
+def test_parallel_evaluate_batch(model_complex, chunk_size):
+    matrix = np.random.RandomState(3).rand(
+        20, model_complex.solution_length())
+    expected = JspEvaluator(model_complex).evaluate_batch(matrix)
+
+    with ParallelJspEvaluator(model_complex, processes=2,
+                              chunk_size=chunk_size) as evaluator:
+        assert np.array_equal(evaluator.evaluate_batch(matrix), expected)
+        assert np.array_equal(
+            evaluator.evaluate_batch(matrix, metrics=["wip", "makespan"]),
+            expected[:, [5, 0]])
+        assert evaluator.evaluate_batch(matrix[:0]).shape == (0, 6)
+        assert evaluator.evaluate(matrix[0]) == expected[0].tolist()
+
+
+def test_parallel_chunk_size(model_complex):
+    matrix = np.random.RandomState(3).rand(
+        100, model_complex.solution_length())
+    with ParallelJspEvaluator(model_complex, processes=2,
+                              start_method="spawn") as evaluator:
+        # every worker gets CHUNKS_PER_PROCESS chunks at first
+        assert evaluator._chunk_size(100) == 13
+        evaluator.evaluate_batch(matrix)
+        assert evaluator._solution_seconds > 0
+
+        # a chunk takes about CHUNK_SECONDS
+        evaluator._solution_seconds = jspeval.CHUNK_SECONDS / 5
+        assert evaluator._chunk_size(100) == 5
+
+
+def test_parallel_dont_accept_unfitting_solutions(model_complex):
+    with ParallelJspEvaluator(model_complex, processes=1) as evaluator:
+        with pytest.raises(ValueError):
+            evaluator.evaluate_batch(np.zeros((3, 2)))
+
+
+@pytest.mark.parametrize("storage", ["dense", "sparse"])
+def test_schedule_population(model_complex, storage):
+    model = JspModel("test/complexmodel.xml", setup_storage=storage)
+    evaluator = JspEvaluator(model)
+    matrix = np.random.RandomState(5).rand(30, model.solution_length())
+    # equal priorities are dispatched in the order they became available
+    matrix[:10] = np.round(matrix[:10], 1)
+    machines, priorities = decode(model, matrix)
+
+    job_starts, job_ends, setuptimes = evaluator._schedule_population(
+        machines, priorities)
+    for row in range(len(matrix)):
+        state = evaluator._schedule_decoded(
+            machines[row], priorities[row].tolist())
+        assert job_starts[row].tolist() == state.job_starts
+        assert job_ends[row].tolist() == state.job_ready
+        assert setuptimes[row] == state.setuptime
+
+
+def test_evaluate_batch_lockstep(model_complex):
+    evaluator = JspEvaluator(model_complex, profile=True)
+    matrix = np.random.RandomState(6).rand(
+        jspeval.LOCKSTEP_POPULATION, model_complex.solution_length())
+
+    with evaluator.profiling() as lockstep:
+        metrics = evaluator.evaluate_batch(matrix)
+    with evaluator.profiling() as single:
+        for row, values in enumerate(matrix):
+            assert evaluator.evaluate(values) == metrics[row].tolist()
+    assert lockstep["dispatch_steps"] == single["dispatch_steps"]
+    assert lockstep["setup_lookups"] == single["setup_lookups"]
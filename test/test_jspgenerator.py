@@ -5,6 +5,7 @@ from lxml import objectify
 from lxml import etree
 from numpy import random
 import jspgenerator
+from jspmodel import JspModel
 
 
 # ---- fixtures ----
@@ -22,8 +23,9 @@ def test_all_parameters_are_read(example_xml):
 
 
 @pytest.mark.parametrize("filename", [
-    pytest.mark.xfail(raises=Exception)("jspgenerator.py"),
-    pytest.mark.xfail(raises=Exception)("non_existing.txt"),
+    pytest.param("jspgenerator.py", marks=pytest.mark.xfail(raises=Exception)),
+    pytest.param("non_existing.txt",
+                 marks=pytest.mark.xfail(raises=Exception)),
 ])
 def test_dont_read_wrong_files(filename):
     jspgenerator.read_yaml(filename)
@@ -34,26 +36,26 @@ def test_validates_correctly(example_xml):
 
 
 @pytest.mark.parametrize("filename", [
-    pytest.mark.xfail(raises=ValueError)
-    ("test/yaml/wrong_allowed_machines.yaml"),
-    pytest.mark.xfail(raises=ValueError)
-    ("test/yaml/wrong_deadline.yaml"),
-    pytest.mark.xfail(raises=ValueError)
-    ("test/yaml/wrong_duration.yaml"),
-    pytest.mark.xfail(raises=ValueError)
-    ("test/yaml/wrong_jobs.yaml"),
-    pytest.mark.xfail(raises=ValueError)
-    ("test/yaml/wrong_lotsize.yaml"),
-    pytest.mark.xfail(raises=ValueError)
-    ("test/yaml/wrong_machines.yaml"),
-    pytest.mark.xfail(raises=ValueError)
-    ("test/yaml/wrong_operations.yaml"),
-    pytest.mark.xfail(raises=ValueError)
-    ("test/yaml/wrong_release.yaml"),
-    pytest.mark.xfail(raises=ValueError)
-    ("test/yaml/wrong_setup.yaml"),
-    pytest.mark.xfail(raises=ValueError)
-    ("test/yaml/wrong_weight.yaml")
+    pytest.param("test/yaml/wrong_allowed_machines.yaml",
+                 marks=pytest.mark.xfail(raises=ValueError)),
+    pytest.param("test/yaml/wrong_deadline.yaml",
+                 marks=pytest.mark.xfail(raises=ValueError)),
+    pytest.param("test/yaml/wrong_duration.yaml",
+                 marks=pytest.mark.xfail(raises=ValueError)),
+    pytest.param("test/yaml/wrong_jobs.yaml",
+                 marks=pytest.mark.xfail(raises=ValueError)),
+    pytest.param("test/yaml/wrong_lotsize.yaml",
+                 marks=pytest.mark.xfail(raises=ValueError)),
+    pytest.param("test/yaml/wrong_machines.yaml",
+                 marks=pytest.mark.xfail(raises=ValueError)),
+    pytest.param("test/yaml/wrong_operations.yaml",
+                 marks=pytest.mark.xfail(raises=ValueError)),
+    pytest.param("test/yaml/wrong_release.yaml",
+                 marks=pytest.mark.xfail(raises=ValueError)),
+    pytest.param("test/yaml/wrong_setup.yaml",
+                 marks=pytest.mark.xfail(raises=ValueError)),
+    pytest.param("test/yaml/wrong_weight.yaml",
+                 marks=pytest.mark.xfail(raises=ValueError))
 ])
 def test_invalidates_wrong_parameters(filename):
     _, param = jspgenerator.read_yaml(filename)
@@ -100,6 +102,44 @@ def test_model_is_generated_correctly(example_xml):
         assert len(o_root.setuptimes.setuptime) == jobcount * jobcount
 
 
+@pytest.mark.parametrize("setup_format", ["dense", "compressed"])
+def test_setup_matrix_is_generated(example_xml, setup_format, tmpdir):
+    models = []
+    for fmt in ("elements", setup_format):
+        root = jspgenerator.generate_random_xmltree(example_xml, 7, fmt)
+        filename = str(tmpdir.join("{}.xml".format(fmt)))
+        with open(filename, "w") as xml_file:
+            xml_file.write(etree.tostring(root).decode("utf8"))
+        models.append(JspModel(filename, keep_tree=False))
+
+    # the same setuptimes in both formats
+    assert models[0] == models[1]
+
+
+def test_setup_families_are_generated(example_xml, tmpdir):
+    params = dict(example_xml, setup_families=3)
+    root = jspgenerator.generate_random_xmltree(params, 7, "families")
+    filename = str(tmpdir.join("families.xml"))
+    with open(filename, "w") as xml_file:
+        xml_file.write(etree.tostring(root).decode("utf8"))
+    model = JspModel(filename)
+
+    families = [int(family) for family
+                in model.setup_families.families.text.split()]
+    setuptimes = model.setuptimes
+    for op1, fam1 in enumerate(families):
+        for op2, fam2 in enumerate(families):
+            if fam1 == fam2:
+                assert setuptimes[op1, op2] == 0.0
+            else:
+                assert 0.0 <= setuptimes[op1, op2] <= 5.0
+
+
+@pytest.mark.xfail(raises=ValueError)
+def test_setup_families_need_parameter(example_xml):
+    jspgenerator.generate_random_xmltree(example_xml, 7, "families")
+
+
 def test_convert_peres_fileformat():
 
     params = jspgenerator.read_peres("test/peres.txt")
@@ -1,7 +1,18 @@
 """ Tests for the JspModel class.
 """
+import os
+import copy
+import pickle
+import multiprocessing
+from multiprocessing import shared_memory
+import gzip
+import shutil
 import pytest
-from jspmodel import JspModel
+import numpy as np
+from lxml import etree
+import jspgenerator
+import jspmodel
+from jspmodel import JspModel, SparseSetupMatrix
 
 
 def test_random_solution_length(rand_solution):
@@ -25,7 +36,7 @@ def test_solution_length(model, model_10operations):
     (2, (1, 0)),
     (3, (1, 1)),
     (-1, (1, 1)),
-    pytest.mark.xfail(raises=IndexError)((4, None)),
+    pytest.param(4, None, marks=pytest.mark.xfail(raises=IndexError)),
 ])
 def test_create_index_translation_list(model, index, expected):
     assert model.translate_global_index(index) == expected
@@ -43,7 +54,7 @@ def test_create_index_translation_list(model, index, expected):
     (8, (2, 1)),
     (9, (2, 2)),
     (-1, (2, 2)),
-    pytest.mark.xfail(raises=IndexError)((10, None)),
+    pytest.param(10, None, marks=pytest.mark.xfail(raises=IndexError)),
 ])
 def test_create_index_translation_list_10operations(
         model_10operations,
@@ -59,7 +70,7 @@ def test_create_index_translation_list_10operations(
     (2, (1, 0)),
     (3, (1, 1)),
     (-1, (1, 1)),
-    pytest.mark.xfail(raises=IndexError)((4, None)),
+    pytest.param(4, None, marks=pytest.mark.xfail(raises=IndexError)),
 ])
 def test_translate_global_index(model, index, expected):
     assert model.translate_global_index(index) == expected
@@ -86,3 +97,359 @@ def test_equality_operator(model):
     assert not model != JspModel("xml/example.xml")
     assert model != JspModel("test/10operations.xml")
     assert not model == JspModel("test/10operations.xml")
+
+
+def test_compiled_arrays(model):
+    assert model.machine_count == 3
+    assert model.op_durations.tolist() == [5.0, 15.0, 15.0, 15.0]
+    assert model.op_jobs.tolist() == [0, 0, 1, 1]
+    assert model.job_offsets.tolist() == [0, 2, 4]
+    assert model.job_releasetimes.tolist() == [0.0, 10.0]
+    assert model.job_deadlines.tolist() == [25.0, 50.0]
+    assert model.job_weights.tolist() == [1.0, 1.5]
+    assert model.job_lotsizes.tolist() == [1, 1]
+    assert model.allowed_offsets.tolist() == [0, 2, 4, 5, 7]
+    assert model.allowed_indices.tolist() == [0, 1, 2, 1, 1, 2, 0]
+    assert model.allowed_counts.tolist() == [2, 2, 1, 2]
+
+
+def test_drop_tree(model):
+    dropped = JspModel("xml/example.xml", keep_tree=False)
+    assert not dropped.has_tree()
+    assert dropped.solution_length() == 4
+    assert dropped.allowed_machines == model.allowed_machines
+    assert dropped.get_setuptime((0, 0), (0, 1)) == 2.0
+    assert dropped == model
+    with pytest.raises(AttributeError):
+        dropped.job
+
+
+@pytest.mark.parametrize("storage", ["dense", "sparse", "auto"])
+@pytest.mark.parametrize("from_, to_, expected", [
+    ((0, 0), (0, 1), 2.0),
+    ((0, 1), (0, 0), 1.5),
+    ((0, 1), (1, 0), 5.5),
+    ((0, 1), (1, 1), 0.0),
+    (None, (1, 1), 0.0),
+])
+def test_setup_storage(storage, from_, to_, expected):
+    model = JspModel("xml/example.xml", setup_storage=storage)
+    assert model.get_setuptime(from_, to_) == expected
+    assert model.setuptimes.shape == (5, 4)
+
+
+def test_setup_matrix(model):
+    dense = JspModel("xml/example.xml", setup_storage="dense")
+    sparse = JspModel("xml/example.xml", setup_storage="sparse")
+
+    assert isinstance(dense.setuptimes, np.ndarray)
+    assert isinstance(sparse.setuptimes, SparseSetupMatrix)
+    assert np.array_equal(sparse.setuptimes.toarray(), dense.setuptimes)
+    assert sparse.setuptimes[1, 2] == dense.setuptimes[1, 2] == 5.5
+    # the "no previous operation" row
+    assert not dense.setuptimes[4].any()
+    assert dense == sparse
+
+
+def test_setup_dtype():
+    model = JspModel("xml/example.xml", setup_dtype=np.float32)
+    assert model.setuptimes.dtype == np.float32
+    assert model.get_setuptime((0, 0), (0, 1)) == 2.0
+
+
+@pytest.mark.xfail(raises=ValueError)
+def test_setup_storage_unknown():
+    JspModel("xml/example.xml", setup_storage="triangular")
+
+
+def test_map_setuptimes(model, tmpdir):
+    filename = str(tmpdir.join("setuptimes.npy"))
+    mapped = JspModel("xml/example.xml", setup_mmap=filename)
+
+    assert isinstance(mapped.setuptimes, np.memmap)
+    assert mapped.get_setuptime((0, 1), (1, 0)) == 5.5
+    assert mapped == model
+
+    # a second model maps the existing file
+    again = JspModel("xml/example.xml", setup_mmap=filename)
+    assert isinstance(again.setuptimes, np.memmap)
+    assert np.array_equal(again.setuptimes, mapped.setuptimes)
+
+
+def test_map_setuptimes_wrong_shape(tmpdir):
+    filename = str(tmpdir.join("setuptimes.npy"))
+    JspModel("test/10operations.xml").save_setuptimes(filename)
+    with pytest.raises(ValueError):
+        JspModel("xml/example.xml", setup_mmap=filename)
+
+
+@pytest.mark.parametrize("filename", [
+    "xml/example.xml",
+    "xml/example.xml.gz",
+    "test/10operations.xml",
+    "test/10machines.xml",
+    "test/complexmodel.xml",
+    "test/partial_setuptime.xml",
+])
+def test_streaming(filename):
+    streamed = JspModel(filename, streaming=True)
+
+    assert not streamed.has_tree()
+    assert streamed == JspModel(filename)
+    assert streamed.allowed_machines == JspModel(filename).allowed_machines
+    assert streamed.op_jobs.dtype == np.intp
+
+
+def test_streaming_comments(tmpdir):
+    # comments and processing instructions between the children
+    with open("xml/example.xml") as xmlfile:
+        content = xmlfile.read()
+    for tag in ("releasetime", "weight", "op_duration", "allowed_machine",
+                "from_operation", "setup_duration"):
+        content = content.replace(
+            "<{}>".format(tag), "<!-- note --><?note?><{}>".format(tag))
+    filename = str(tmpdir.join("commented.xml"))
+    with open(filename, "w") as xmlfile:
+        xmlfile.write(content)
+
+    streamed = JspModel(filename, streaming=True)
+    assert streamed == JspModel(filename)
+    assert streamed == JspModel("xml/example.xml")
+
+
+def test_streaming_mapped_setuptimes(model, tmpdir):
+    filename = str(tmpdir.join("setuptimes.npy"))
+    model.save_setuptimes(filename)
+    streamed = JspModel("xml/example.xml", streaming=True, setup_mmap=filename)
+
+    assert isinstance(streamed.setuptimes, np.memmap)
+    assert streamed == model
+
+
+def test_streaming_invalid_file():
+    # the file uses the outdated starttime element
+    with pytest.raises(etree.XMLSyntaxError):
+        JspModel("yaml/example.xml.gz", streaming=True)
+
+
+@pytest.mark.parametrize("filename, storage", [
+    ("xml/example.xml", "dense"),
+    ("xml/example.xml", "sparse"),
+    ("test/complexmodel.xml", "auto"),
+])
+def test_compiled_cache(filename, storage, tmpdir):
+    cache = str(tmpdir.join("model.compiled"))
+    parsed = JspModel(filename, setup_storage=storage, cache=cache)
+    # like a cached model, the parsed one has no tree
+    assert not parsed.has_tree()
+    assert parsed == JspModel(filename)
+
+    cached = JspModel(filename, setup_storage=storage, cache=cache)
+    assert not cached.has_tree()
+    assert isinstance(cached.op_durations, np.memmap)
+    assert isinstance(cached.setuptimes, type(parsed.setuptimes))
+    assert cached == parsed
+    assert cached.allowed_machines == parsed.allowed_machines
+    assert cached.machine_count == parsed.machine_count
+
+
+def _from_cache(model):
+    return isinstance(model.op_durations, np.memmap)
+
+
+def test_compiled_cache_stale(tmpdir, monkeypatch):
+    filename = str(tmpdir.join("model.xml"))
+    shutil.copy("xml/example.xml", filename)
+    assert not _from_cache(JspModel(filename, cache=True))
+    assert os.path.exists(filename + ".compiled")
+
+    # an unchanged content with a new modification time is still valid
+    os.utime(filename, (0, 0))
+    hashed = []
+    file_hash = jspmodel.file_hash
+    monkeypatch.setattr(jspmodel, "file_hash",
+                        lambda name: hashed.append(name) or file_hash(name))
+    assert _from_cache(JspModel(filename, cache=True))
+    assert len(hashed) == 1
+    # the new modification time was stored, the file is not hashed again
+    assert _from_cache(JspModel(filename, cache=True))
+    assert len(hashed) == 1
+
+    # another model in the same file is parsed again and the cache rewritten
+    shutil.copy("test/10operations.xml", filename)
+    reparsed = JspModel(filename, cache=True)
+    assert not _from_cache(reparsed)
+    assert reparsed.solution_length() == 10
+    assert JspModel(filename, cache=True) == reparsed
+
+    # a different setup dtype does not use the cache either
+    assert not _from_cache(
+        JspModel(filename, setup_dtype=np.float32, cache=True))
+
+
+def test_compiled_cache_truncated(tmpdir):
+    filename = str(tmpdir.join("model.xml"))
+    shutil.copy("xml/example.xml", filename)
+    JspModel(filename, cache=True)
+    cache = filename + ".compiled"
+    with open(cache, "r+b") as cachefile:
+        cachefile.truncate(os.path.getsize(cache) - 100)
+
+    # the damaged cache is ignored and rewritten
+    reparsed = JspModel(filename, cache=True)
+    assert not _from_cache(reparsed)
+    assert reparsed == JspModel(filename)
+    assert _from_cache(JspModel(filename, cache=True))
+
+
+@pytest.mark.parametrize("filename", [
+    "test/setup_matrix.xml",
+    "test/setup_sparse.xml",
+])
+@pytest.mark.parametrize("storage", ["dense", "sparse", "auto"])
+@pytest.mark.parametrize("streaming", [False, True])
+def test_setup_matrix_element(filename, storage, streaming):
+    model = JspModel("xml/example.xml", keep_tree=False)
+    compact = JspModel(filename, setup_storage=storage, streaming=streaming,
+                       keep_tree=False)
+
+    assert compact == model
+    assert compact.get_setuptime((0, 1), (1, 0)) == 5.5
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+@pytest.mark.parametrize("from_, to_, expected", [
+    ((0, 0), (0, 1), 3.0),
+    ((0, 1), (1, 0), 0.0),
+    ((0, 1), (1, 1), 1.5),
+    ((1, 1), (0, 0), 0.0),
+    (None, (0, 1), 0.0),
+])
+def test_setup_families(streaming, from_, to_, expected):
+    model = JspModel("test/setup_families.xml", streaming=streaming)
+    assert model.get_setuptime(from_, to_) == expected
+
+
+def test_setup_matrix_element_wrong_order(tmpdir):
+    filename = str(tmpdir.join("model.xml"))
+    with open("test/setup_matrix.xml") as model_file:
+        content = model_file.read().replace("o22 o21 o2 o1", "o22 o21 o2 o2")
+    with open(filename, "w") as model_file:
+        model_file.write(content)
+
+    with pytest.raises(ValueError):
+        JspModel(filename)
+
+
+@pytest.mark.parametrize("compression", [False, True])
+def test_from_peres(compression, tmpdir):
+    filename = "test/peres.txt"
+    if compression:
+        filename = str(tmpdir.join("peres.txt.gz"))
+        with open("test/peres.txt", "rb") as peres_file:
+            with gzip.open(filename, "wb") as gz_file:
+                gz_file.write(peres_file.read())
+    model = JspModel.from_peres(filename)
+
+    # the same model as the converted xml file
+    root = jspgenerator.generate_peres_xmltree(
+        jspgenerator.read_peres("test/peres.txt"))
+    xml_filename = str(tmpdir.join("peres.xml"))
+    with open(xml_filename, "w") as xml_file:
+        xml_file.write(etree.tostring(root).decode("utf8"))
+    converted = JspModel(xml_filename, keep_tree=False)
+
+    assert not model.has_tree()
+    assert model == converted
+    assert model.allowed_machines == converted.allowed_machines
+    assert model.index_translation_list == converted.index_translation_list
+    assert model.op_jobs.dtype == np.intp
+
+
+def test_from_peres_missing_jobs(tmpdir):
+    filename = str(tmpdir.join("peres.txt"))
+    with open("test/peres.txt") as peres_file:
+        lines = peres_file.readlines()
+    with open(filename, "w") as peres_file:
+        peres_file.writelines(lines[:-1])
+
+    with pytest.raises(ValueError):
+        JspModel.from_peres(filename)
+
+
+@pytest.mark.parametrize("storage", ["dense", "sparse"])
+def test_pickle(model, storage):
+    model = JspModel("xml/example.xml", setup_storage=storage)
+    data = pickle.dumps(model)
+    unpickled = pickle.loads(data)
+
+    # only the compiled arrays are pickled
+    assert len(data) < os.path.getsize("xml/example.xml")
+    assert not unpickled.has_tree()
+    assert unpickled == model
+    assert type(unpickled.setuptimes) is type(model.setuptimes)
+    assert unpickled.get_setuptime((0, 1), (1, 0)) == 5.5
+    assert unpickled.allowed_machines == model.allowed_machines
+    assert unpickled.index_translation_list == model.index_translation_list
+
+
+def test_pickle_mapped_model(model, tmpdir):
+    filename = str(tmpdir.join("setuptimes.npy"))
+    mapped = JspModel("xml/example.xml", setup_mmap=filename)
+    unpickled = pickle.loads(pickle.dumps(mapped))
+
+    assert not isinstance(unpickled.setuptimes, np.memmap)
+    assert unpickled == model
+
+
+def test_copy_keeps_tree(model):
+    assert copy.copy(model).has_tree()
+    assert copy.deepcopy(model) == model
+
+
+@pytest.mark.parametrize("storage", ["dense", "sparse"])
+def test_shared(model, storage):
+    model = JspModel("xml/example.xml", setup_storage=storage)
+    with model.shared() as shared:
+        name = shared._shared[0].name
+        assert not shared.has_tree()
+        assert shared == model
+
+        # pickled by the name of the block
+        data = pickle.dumps(shared)
+        assert len(data) < len(pickle.dumps(model))
+        attached = pickle.loads(data)
+        assert attached == model
+        assert attached.allowed_machines == model.allowed_machines
+        del attached
+
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+
+def test_shared_in_workers(model):
+    with model.shared() as shared:
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(2) as pool:
+            setuptimes = pool.starmap(
+                JspModel.get_setuptime, [(shared, (0, 1), (1, 0))] * 2)
+    assert setuptimes == [5.5, 5.5]
+
+
+def test_shared_unlinked_on_error(model):
+    with pytest.raises(KeyError):
+        with model.shared() as shared:
+            name = shared._shared[0].name
+            raise KeyError()
+
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+
+def test_sparse_setup_lookup():
+    sparse = JspModel("xml/example.xml", setup_storage="sparse").setuptimes
+    dense = sparse.toarray()
+    rows, cols = np.indices(dense.shape)
+
+    assert np.array_equal(sparse.lookup(rows, cols), dense)
+    assert sparse.lookup(np.array([1]), np.array([2])).tolist() == [5.5]
@@ -0,0 +1,155 @@
+"""
+Tests for the jsppareto module.
+"""
+import pytest
+import numpy as np
+from jspeval import JspEvaluator
+from jsppareto import non_dominated_sort, pareto_front, crowding_distance, \
+    hypervolume, ParetoArchive
+
+
+def dominated(first, second):
+    return all(a <= b for a, b in zip(first, second)) and \
+        any(a < b for a, b in zip(first, second))
+
+
+def naive_fronts(metrics):
+    ranks = [None] * len(metrics)
+    remaining = set(range(len(metrics)))
+    front = 0
+    while remaining:
+        current = [i for i in remaining if not any(
+            dominated(metrics[j], metrics[i]) for j in remaining)]
+        for i in current:
+            ranks[i] = front
+        remaining -= set(current)
+        front += 1
+    return ranks
+
+
+def test_non_dominated_sort_simple():
+    metrics = [[1, 5], [2, 2], [5, 1], [3, 3], [2, 2], [6, 6], [4, 4]]
+
+    assert non_dominated_sort(metrics).tolist() == [0, 0, 0, 1, 0, 3, 2]
+    assert pareto_front(metrics).tolist() == [0, 1, 2, 4]
+
+
+def test_non_dominated_sort_random():
+    for _ in range(20):
+        metrics = np.random.randint(0, 4, size=(50, 6)).astype(float)
+
+        ranks = non_dominated_sort(metrics)
+        assert ranks.tolist() == naive_fronts(metrics.tolist())
+        assert pareto_front(metrics).tolist() == \
+            np.flatnonzero(ranks == 0).tolist()
+
+
+def test_non_dominated_sort_population(model_complex):
+    metrics = JspEvaluator(model_complex).evaluate_batch(
+        np.random.rand(100, model_complex.solution_length()))
+
+    assert non_dominated_sort(metrics).tolist() == \
+        naive_fronts(metrics.tolist())
+
+
+@pytest.mark.parametrize("metrics", [
+    np.zeros(6),
+    np.zeros((2, 3, 6)),
+])
+def test_non_dominated_sort_invalid(metrics):
+    with pytest.raises(ValueError):
+        non_dominated_sort(metrics)
+
+
+def test_crowding_distance():
+    distances = crowding_distance([[0, 4], [1, 2], [2, 1], [4, 0]])
+
+    assert distances[0] == distances[3] == np.inf
+    assert np.allclose(distances[1:3], [1.25, 1.25])
+    assert crowding_distance([[1, 2], [2, 1]]).tolist() == [np.inf, np.inf]
+
+
+@pytest.mark.parametrize("metrics, reference, expected", [
+    ([[1]], [3], 2),
+    ([[1, 2], [2, 1], [3, 3]], [3, 3], 3),
+    ([[1, 2, 1], [2, 1, 2], [2, 2, 2]], [3, 3, 3], 5),
+    ([[0, 1, 1, 1], [1, 0, 1, 1], [1, 1, 1, 1]], [2, 2, 2, 2], 3),
+    # vectors outside of the reference point do not contribute
+    ([[1, 4], [4, 1]], [3, 3], 0),
+    ([[1, 4], [2, 2]], [3, 3], 1),
+])
+def test_hypervolume(metrics, reference, expected):
+    assert hypervolume(metrics, reference) == expected
+
+
+def test_hypervolume_objectives():
+    metrics = np.array([[1, 0, 2, 0, 0, 0], [2, 0, 1, 0, 0, 0]])
+
+    assert hypervolume(metrics, [3, 3], objectives=[0, 2]) == 3
+    assert hypervolume(metrics, [3, 3],
+                       objectives=["makespan", "flowfactor"]) == 3
+
+
+def test_hypervolume_sampled():
+    metrics = np.random.rand(30, 5)
+    metrics[:, 4] = 0
+    exact = hypervolume(metrics, [1] * 4, objectives=range(4))
+    estimate = hypervolume(metrics, [1] * 5, samples=50000, seed=1)
+
+    assert abs(estimate - exact) < 0.02
+
+
+@pytest.mark.parametrize("reference", [
+    [1, 1],
+    [1, 1, 1, 1],
+])
+def test_hypervolume_invalid_reference(reference):
+    with pytest.raises(ValueError):
+        hypervolume([[0.5, 0.5, 0.5]], reference)
+
+
+def test_archive_insertion():
+    archive = ParetoArchive(10, 2)
+
+    assert archive.add([2, 2], "a")
+    # dominated and equal vectors are rejected
+    assert not archive.add([3, 2], "b")
+    assert not archive.add([2, 2], "c")
+    assert archive.add([1, 3], "d")
+    # dominated archived vectors are removed
+    assert archive.add([1, 1], "e")
+    assert len(archive) == 1
+    assert archive.solutions == ["e"]
+    assert archive.metrics.tolist() == [[1, 1]]
+
+
+def test_archive_eviction():
+    archive = ParetoArchive(4, 2)
+    for value in (0, 4, 1, 3):
+        archive.add([value, 4 - value], value)
+    # the archive is full, the most crowded vector is evicted
+    archive.add([1.5, 2.5], 1.5)
+
+    assert len(archive) == 4
+    assert sorted(archive.solutions) == [0, 1.5, 3, 4]
+
+
+def test_archive_add_batch():
+    metrics = np.random.rand(200, 3)
+    archive = ParetoArchive(1000, 3)
+    inserted = archive.add_batch(metrics, list(range(200)))
+    front = pareto_front(metrics)
+
+    assert inserted == len(archive) == len(front)
+    assert sorted(archive.solutions) == front.tolist()
+    assert np.array_equal(archive.metrics,
+                          metrics[np.array(archive.solutions)])
+
+
+@pytest.mark.parametrize("maxsize, metrics", [
+    (0, [1.0] * 6),
+    (10, [1.0] * 5),
+])
+def test_archive_invalid(maxsize, metrics):
+    with pytest.raises(ValueError):
+        ParetoArchive(maxsize).add(metrics)
@@ -0,0 +1,105 @@
+""" Tests for the ModelRegistry class.
+"""
+import os
+import shutil
+import pytest
+from jspmodel import JspModel
+from jspregistry import ModelRegistry, find_models, model_name
+
+
+# ---- fixtures ----
+@pytest.fixture
+def model_dir(tmpdir):
+    shutil.copy("xml/example.xml", str(tmpdir.join("example.xml")))
+    shutil.copy("xml/example.xml.gz", str(tmpdir.join("compressed.xml.gz")))
+    shutil.copy("test/10operations.xml", str(tmpdir.join("10operations.xml")))
+    shutil.copy("test/peres.txt", str(tmpdir.join("peres.txt")))
+    return str(tmpdir)
+
+
+# ---- tests ----
+@pytest.mark.parametrize("filename, expected", [
+    ("xml/example.xml", "example"),
+    ("xml/example.xml.gz", "example"),
+    ("test/peres.txt", "peres"),
+])
+def test_model_name(filename, expected):
+    assert model_name(filename) == expected
+
+
+def test_find_models(model_dir):
+    assert [os.path.basename(name) for name in find_models(model_dir)] == \
+        ["10operations.xml", "compressed.xml.gz", "example.xml"]
+    assert [os.path.basename(name) for name
+            in find_models(os.path.join(model_dir, "*.txt"))] == ["peres.txt"]
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_load(model_dir, processes):
+    registry = ModelRegistry(processes)
+    models = registry.load(model_dir)
+
+    assert sorted(models) == ["10operations", "compressed", "example"]
+    assert not models["example"].has_tree()
+    assert models["example"] == JspModel("xml/example.xml")
+    assert models["10operations"] == JspModel("test/10operations.xml")
+    # the compressed file has a different content hash
+    assert len(registry) == 3
+
+
+def test_served_from_memory(model_dir):
+    registry = ModelRegistry(2)
+    models = registry.load(model_dir)
+    again = registry.load(os.path.join(model_dir, "*.xml"))
+
+    assert again["example"] is models["example"]
+    assert registry.get(os.path.join(model_dir, "example.xml")) is \
+        models["example"]
+
+    # a copy of a loaded file shares its model
+    shutil.copy(os.path.join(model_dir, "example.xml"),
+                os.path.join(model_dir, "copy.xml"))
+    assert registry.load(model_dir)["copy"] is models["example"]
+    assert len(registry) == 3
+
+
+def test_changed_file_is_reloaded(model_dir):
+    registry = ModelRegistry(1)
+    filename = os.path.join(model_dir, "example.xml")
+    model = registry.get(filename)
+    sha256 = registry.content_hash(filename)
+    assert registry[sha256] is model
+
+    shutil.copy("test/10operations.xml", filename)
+    reloaded = registry.get(filename)
+    assert reloaded is not model
+    assert reloaded.solution_length() == 10
+    assert registry.content_hash(filename) != sha256
+
+
+def test_load_duplicate_names(model_dir):
+    shutil.copy("xml/example.xml.gz", os.path.join(model_dir,
+                                                   "example.xml.gz"))
+    for subdir in ("a", "b"):
+        os.mkdir(os.path.join(model_dir, subdir))
+        shutil.copy("xml/example.xml",
+                    os.path.join(model_dir, subdir, "example.xml"))
+
+    registry = ModelRegistry(1)
+    # the same name with another suffix and in other directories
+    for pattern in (model_dir, os.path.join(model_dir, "*", "example.xml")):
+        with pytest.raises(ValueError):
+            registry.load(pattern)
+    # nothing was loaded
+    assert len(registry) == 0
+
+
+def test_load_peres(model_dir):
+    registry = ModelRegistry(1)
+    models = registry.load(os.path.join(model_dir, "*.txt"))
+    assert models["peres"] == JspModel.from_peres("test/peres.txt")
+
+
+@pytest.mark.xfail(raises=IOError)
+def test_get_missing_file():
+    ModelRegistry(1).get("non_existing.xml")
@@ -2,7 +2,7 @@
 """
 import pytest
 import numpy as np
-from jspsolution import JspSolution
+from jspsolution import JspSolution, decode
 from test.conftest import isclose
 
 
@@ -11,7 +11,7 @@ from test.conftest import isclose
     (1, 2),
     (2, 1),
     (3, 2),
-    pytest.mark.xfail(raises=IndexError)((4, None)),
+    pytest.param(4, None, marks=pytest.mark.xfail(raises=IndexError)),
 ])
 def test_determine_machine(model, index, expected):
     solution = JspSolution(model, [0.1, 0.4, 0.9, 0.2])
@@ -97,3 +97,40 @@ def test_do_not_allow_negative_allel_np(model):
 @pytest.mark.xfail(raises=ValueError)
 def test_do_not_allow_allel_over_1_np(model):
     JspSolution(model, np.array([1.03, 0.33, 0.61, 0.98]))
+
+
+def test_decode_population(model):
+    population = np.array([[0.1, 0.4, 0.9, 0.2],
+                           [0.03, 0.33, 0.61, 0.98]])
+    machines, priorities = decode(model, population)
+
+    assert machines.tolist() == [[0, 2, 1, 2], [0, 2, 1, 0]]
+    for row, values in enumerate(population):
+        solution = JspSolution(model, values)
+        for index in range(len(values)):
+            assert priorities[row, index] == solution.get_priority(index)
+
+
+def test_decode_allel_1(model):
+    machines, priorities = decode(model, [1.0, 1.0, 1.0, 1.0])
+
+    assert machines.tolist() == [1, 1, 1, 0]
+    assert priorities.tolist() == [1.0, 1.0, 1.0, 1.0]
+
+
+@pytest.mark.parametrize("values", [
+    [0.1, 0.2, 0.3],
+    np.zeros((2, 5)),
+])
+def test_decode_unfitting_solution(model, values):
+    with pytest.raises(IndexError):
+        decode(model, values)
+
+
+@pytest.mark.parametrize("values", [
+    [0.1, 0.2, 0.3, float("nan")],
+    np.array([[0.1, 0.2, 0.3, 0.4], [0.1, 0.2, 0.3, 1.4]]),
+])
+def test_decode_invalid_allel(model, values):
+    with pytest.raises(ValueError):
+        decode(model, values)